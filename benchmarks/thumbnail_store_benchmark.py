@@ -0,0 +1,59 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, CTImageStorage, generate_uid
+
+from viewer.dicom_utils.io import list_dicoms_from_dir
+from viewer.images.thumbnail_store import ThumbnailStore
+
+FILE_COUNT = 500
+IMAGE_SIZE = 512
+
+
+def write_series(directory, count, size):
+    rng = np.random.default_rng(0)
+    series = generate_uid()
+    for i in range(count):
+        dcm = Dataset()
+        dcm.file_meta = FileMetaDataset()
+        dcm.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        dcm.file_meta.MediaStorageSOPClassUID = CTImageStorage
+        dcm.SOPInstanceUID = dcm.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        dcm.SOPClassUID = CTImageStorage
+        dcm.SeriesInstanceUID = series
+        dcm.InstanceNumber = i + 1
+        dcm.Rows = dcm.Columns = size
+        dcm.BitsAllocated, dcm.BitsStored, dcm.HighBit, dcm.PixelRepresentation = 16, 12, 11, 0
+        dcm.SamplesPerPixel, dcm.PhotometricInterpretation = 1, 'MONOCHROME2'
+        dcm.WindowWidth, dcm.WindowCenter = 400, 1064
+        dcm.PixelData = rng.integers(0, 4096, (size, size), dtype=np.uint16).tobytes()
+        dcm.save_as(os.path.join(directory, '{:04d}.dcm'.format(i)), enforce_file_format=True)
+
+
+def load_all(store_path, paths):
+    store = ThumbnailStore(store_path)
+    start = time.perf_counter()
+    for path in paths:
+        store.load(path)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        write_series(directory, FILE_COUNT, IMAGE_SIZE)
+        paths = list_dicoms_from_dir(directory + '/')
+        store_path = os.path.join(directory, 'thumbnails.sqlite')
+        cold = load_all(store_path, paths)
+        warm = load_all(store_path, paths)
+        print('{} files, {}x{} pixels'.format(len(paths), IMAGE_SIZE, IMAGE_SIZE))
+        print('cold: {:.3f} s ({:.0f} files/s)'.format(cold, len(paths) / cold))
+        print('warm: {:.3f} s ({:.0f} files/s), {:.1f}x faster'.format(warm, len(paths) / warm, cold / warm))
+
+
+if __name__ == '__main__':
+    main()
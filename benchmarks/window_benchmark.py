@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+
+from viewer.dicom_utils.lut import apply_window
+
+SIZES = (512, 2048, 4096)
+REFERENCE_ROWS = 16
+
+
+def map_pixel(pixel, window_width, window_centre):
+    if pixel < window_centre - window_width / 2.0:
+        return 0.0
+    if pixel > window_centre + window_width / 2.0:
+        return 255.0
+    return (pixel - window_centre + window_width / 2.0) / window_width * 255.0
+
+
+def reference_window(image, window_width, window_centre):
+    img = np.ndarray(image.shape).astype(np.uint8)
+    for i in range(len(image)):
+        for j in range(len(image[i])):
+            img[i][j] = map_pixel(image[i][j], window_width, window_centre)
+    return img
+
+
+def measure(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    window_width, window_centre = 400.0, 1040.0
+    print('{:>6} {:>14} {:>14} {:>10}'.format('size', 'per-pixel [s]', 'lut [s]', 'speedup'))
+    for size in SIZES:
+        image = rng.integers(0, 4096, (size, size), dtype=np.uint16)
+        sample = image[:REFERENCE_ROWS]
+        with np.errstate(invalid='ignore'):
+            reference_time, expected = measure(lambda: reference_window(sample, window_width, window_centre),
+                                               repeat=1)
+        reference_time *= size / REFERENCE_ROWS
+        lut_time, windowed = measure(lambda: apply_window(image, window_width, window_centre, 12))
+        assert np.array_equal(windowed[:REFERENCE_ROWS], expected)
+        print('{:>6} {:>14.3f} {:>14.4f} {:>9.0f}x'.format(size, reference_time, lut_time,
+                                                           reference_time / lut_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from viewer.command.command import ANNOTATION_TAG, Command, CurveCommand, AngleCommand, RectangleCommand, \
+    EllipseCommand, DistanceCommand, TextCommand, command_tag
+from viewer.utils.paths import user_cache_dir
+
+STORE_NAME = 'annotations.sqlite'
+
+CURVE = 'curve'
+DISTANCE = 'distance'
+ANGLE = 'angle'
+RECTANGLE = 'rectangle'
+ELLIPSE = 'ellipse'
+KINDS = {CurveCommand: CURVE, DistanceCommand: DISTANCE, AngleCommand: ANGLE, RectangleCommand: RECTANGLE,
+         EllipseCommand: ELLIPSE}
+
+
+class Annotation:
+    # points are in image coordinates, the label location is stored as one more point after them
+    def __init__(self, kind, color, points, label=None):
+        self.kind = kind
+        self.color = color
+        self.points = points
+        self.label = label
+
+
+def _transform(points, matrix):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+
+def from_command(command, to_image):
+    kind = KINDS.get(type(command))
+    if kind is None:
+        return None
+    points = list(command.points) if kind != CURVE else np.frombuffer(command.points, dtype=np.int32)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    label = None
+    for sub_command in getattr(command, 'commands', ()):
+        if isinstance(sub_command, TextCommand):
+            label = str(sub_command.text)
+            points = np.vstack((points, sub_command.location))
+    return Annotation(kind, command.color, _transform(points, to_image).astype(np.float32), label)
+
+
+def encode(annotations):
+    header = json.dumps([(a.kind, a.color, len(a.points), a.label) for a in annotations],
+                        separators=(',', ':')).encode()
+    points = np.concatenate([a.points for a in annotations]).astype('<f4') if annotations else np.empty(0, '<f4')
+    return zlib.compress(struct.pack('<I', len(header)) + header + points.tobytes())
+
+
+def decode(data):
+    data = zlib.decompress(data)
+    header_size = struct.unpack_from('<I', data)[0]
+    header = json.loads(data[4:4 + header_size])
+    points = np.frombuffer(data, dtype='<f4', offset=4 + header_size).reshape(-1, 2)
+    annotations = []
+    start = 0
+    for kind, color, count, label in header:
+        annotations.append(Annotation(kind, color, points[start:start + count], label))
+        start += count
+    return annotations
+
+
+class AnnotationStore:
+    def __init__(self, path=None):
+        self.path = path if path is not None else os.path.join(user_cache_dir(), STORE_NAME)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS annotations (uid TEXT PRIMARY KEY, data BLOB, '
+                                'updated REAL)')
+
+    def get(self, uid):
+        row = self.connection.execute('SELECT data FROM annotations WHERE uid = ?', (uid,)).fetchone()
+        return decode(row[0]) if row is not None else []
+
+    def put(self, uid, annotations):
+        if annotations:
+            self.connection.execute('INSERT OR REPLACE INTO annotations VALUES (?, ?, ?)',
+                                    (uid, encode(annotations), time.time()))
+        else:
+            self.connection.execute('DELETE FROM annotations WHERE uid = ?', (uid,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class RestoredAnnotationsCommand(Command):
+    # every annotation restored for an image is drawn and undone as one history entry
+    on_canvas = True
+
+    def __init__(self, canvas, annotations, to_canvas):
+        self.canvas = canvas
+        self.annotations = annotations
+        self.to_canvas = to_canvas
+        self.tag = command_tag()
+
+    def execute(self):
+        create = {CURVE: self._draw_line, DISTANCE: self._draw_line, ANGLE: self._draw_line,
+                  RECTANGLE: self.canvas.create_rectangle, ELLIPSE: self.canvas.create_oval}
+        tags = (ANNOTATION_TAG, self.tag)
+        for annotation in self.annotations:
+            points = _transform(annotation.points, self.to_canvas)
+            if annotation.label is not None:
+                points, location = points[:-1], points[-1]
+            coordinates = points.ravel().tolist()
+            if annotation.kind in (RECTANGLE, ELLIPSE):
+                create[annotation.kind](*coordinates, outline=annotation.color, width=3, tags=tags)
+            else:
+                create[annotation.kind](coordinates, annotation.color, tags)
+            if annotation.label is not None:
+                self.canvas.create_text(*location, text=annotation.label, fill=annotation.color, tags=tags)
+
+    def _draw_line(self, coordinates, color, tags):
+        return self.canvas.create_line(*coordinates, fill=color, width=3, tags=tags)
+
+    def undo(self):
+        self.canvas.delete(self.tag)
+
+
+def record(command, to_image):
+    # taken when the command is confirmed, later rotations and flips move the image under the canvas items
+    command.annotation = from_command(command, to_image)
+
+
+def collect(commands):
+    annotations = []
+    for command in commands:
+        if isinstance(command, RestoredAnnotationsCommand):
+            annotations.extend(command.annotations)
+        elif getattr(command, 'annotation', None) is not None:
+            annotations.append(command.annotation)
+    return annotations
@@ -1,12 +1,32 @@
+import itertools
 import math
 from abc import ABC
+from array import array
+
+import numpy as np
 
 from viewer.command.status import CommandStatus
+from viewer.images.roi import RECTANGLE, ELLIPSE
 from viewer.math.utils import vectors_differ, radians_to_degrees, points_to_vector, normalize_vector, sum_vectors, \
-    vector_length, vectors_angle
+    vector_length, vectors_angle, simplify_polyline
+
+CURVE_TOLERANCE = 1.0
+
+# labels are centred on their location, so statistics lines push it down to keep the label clear of the ROI
+STATISTICS_LINE_OFFSET = 7
+
+# every item a command draws carries the layer tag and the tag of the command that owns it
+ANNOTATION_TAG = 'annotation'
+_command_ids = itertools.count()
+
+
+def command_tag():
+    return 'command-{}'.format(next(_command_ids))
 
 
 class Command(ABC):
+    on_canvas = False
+
     def execute(self):
         pass
 
@@ -15,8 +35,11 @@ class Command(ABC):
 
 
 class ComplexCommand(Command):
+    on_canvas = True
+
     def __init__(self, canvas, commands=None):
         self.canvas = canvas
+        self.tag = command_tag()
         if commands is None:
             commands = []
         self.commands = commands
@@ -31,43 +54,115 @@ class ComplexCommand(Command):
             command.execute()
 
     def undo(self):
-        for c in reversed(self.commands):
-            c.undo()
+        # sub commands share this command's tag, so all of their items go in one call
+        self.canvas.delete(self.tag)
 
+    def _set_point(self, point, final):
+        # the last point follows the mouse until it is confirmed
+        if len(self.points) > self.confirmed:
+            self.points[-1] = point
+        else:
+            self.points.append(point)
+        if final:
+            self.confirmed += 1
 
-class CurveCommand(ComplexCommand):
-    def __init__(self, canvas, color):
-        ComplexCommand.__init__(self, canvas)
+    def _place(self, index, shape, point1, point2):
+        # rubber band shapes are moved in place rather than deleted and recreated on every motion event
+        if index < len(self.commands):
+            self.commands[index].move(point1, point2)
+        else:
+            command = shape(self.canvas, point1, point2, self.color, self.tag)
+            command.execute()
+            self.commands.append(command)
+
+
+class CurveCommand(Command):
+    on_canvas = True
+
+    def __init__(self, canvas, color, tolerance=CURVE_TOLERANCE):
+        self.id = None
+        self.canvas = canvas
+        self.tag = command_tag()
         self.color = color
-        self.prev_point = None
+        self.tolerance = tolerance
+        self.points = array('i')  # flat x, y pairs
 
     def add_point(self, point, final=False):
-        if self.prev_point is not None:
-            dc = LineCommand(self.canvas, self.prev_point, point, self.color)
-            dc.execute()
-            self.commands.append(dc)
-        self.prev_point = point
-        return CommandStatus.SUCCESS if final else CommandStatus.IN_PROGRESS
+        if len(self.points) < 2 or (self.points[-2], self.points[-1]) != (point[0], point[1]):
+            self.points.extend((int(point[0]), int(point[1])))
+            if self.id is not None:
+                self.canvas.coords(self.id, self.points.tolist())
+            elif len(self.points) >= 4:
+                self.execute()
+        if not final:
+            return CommandStatus.IN_PROGRESS
+        if self.id is None:
+            return CommandStatus.FAIL
+        simplified = simplify_polyline(np.frombuffer(self.points, dtype=np.int32).reshape(-1, 2), self.tolerance)
+        self.points = array('i', simplified.astype(np.int32).ravel().tolist())
+        self.canvas.coords(self.id, self.points.tolist())
+        return CommandStatus.SUCCESS
+
+    def execute(self):
+        self.id = self.canvas.create_line(*self.points, fill=self.color, width=3, tags=(ANNOTATION_TAG, self.tag))
+
+    def undo(self):
+        if self.id is not None:
+            self.canvas.delete(self.id)
+            self.id = None
+
+
+def _statistics_text(statistics, kind, points):
+    stats = statistics(kind, points[0], points[1]) if statistics is not None else None
+    if stats is None:
+        return ''
+    unit = stats.get('unit', '')
+    return "\nMean: {:.1f} {}\nSD: {:.1f}\nMin/Max: {:.1f}/{:.1f}\nN: {}".format(
+        stats['mean'], unit, stats['sd'], stats['min'], stats['max'], stats['count'])
+
+
+class TransformCommand(Command):
+    def __init__(self, display, transform, **transform_args):
+        self.display = display
+        self.transform = transform
+        self.transform_args = transform_args
+        self.generation = None
+
+    def execute(self):
+        self.generation = self.display.generation
+        self.display.push_transform(self.transform, **self.transform_args)
+
+    def undo(self):
+        # a new image clears the display's transforms, so older history must not pop the new image's stack
+        if self.display.generation == self.generation:
+            self.display.pop_transform()
 
 
 class TextCommand(Command):
-    def __init__(self, canvas, text, color, location):
+    on_canvas = True
+
+    def __init__(self, canvas, text, color, location, tag=None):
         self.id = None
         self.canvas = canvas
+        self.tag = tag if tag is not None else command_tag()
         self.text = text
         self.color = color
         self.location = location
 
     def execute(self):
-        self.id = self.canvas.create_text(self.location[0], self.location[1], text=self.text, fill=self.color)
+        self.id = self.canvas.create_text(self.location[0], self.location[1], text=self.text, fill=self.color,
+                                          tags=(ANNOTATION_TAG, self.tag))
 
     def undo(self):
         self.canvas.delete(self.id)
 
 
 class LineCommand(Command):
-    def __init__(self, canvas, start_point, end_point, color):
+    on_canvas = True
+
+    def __init__(self, canvas, start_point, end_point, color, tag=None):
         self.id = None
+        self.tag = tag if tag is not None else command_tag()
         self.start_point = start_point
         self.end_point = end_point
         self.canvas = canvas
@@ -75,7 +170,12 @@ class LineCommand(Command):
 
     def execute(self):
         self.id = self.canvas.create_line(self.start_point[0], self.start_point[1],
-                                          self.end_point[0], self.end_point[1], fill=self.color, width=3)
+                                          self.end_point[0], self.end_point[1], fill=self.color, width=3,
+                                          tags=(ANNOTATION_TAG, self.tag))
+
+    def move(self, start_point, end_point):
+        self.start_point, self.end_point = start_point, end_point
+        self.canvas.coords(self.id, start_point[0], start_point[1], end_point[0], end_point[1])
 
     def undo(self):
         self.canvas.delete(self.id)
@@ -92,27 +192,10 @@ class AngleCommand(ComplexCommand):
         self.measure = with_measurement
 
     def add_point(self, point, final=False):
-        if final:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            self.confirmed += 1
-            if len(self.points) in [2, 3]:
-                command = LineCommand(self.canvas, self.points[len(self.points) - 2],
-                                      self.points[len(self.points) - 1], self.color)
-                command.execute()
-                self.commands.append(command)
-        else:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            if len(self.points) in [2, 3]:
-                command = LineCommand(self.canvas, self.points[len(self.points) - 2],
-                                      self.points[len(self.points) - 1], self.color)
-                command.execute()
-                self.commands.append(command)
+        self._set_point(point, final)
+        if len(self.points) in [2, 3]:
+            index = len(self.points) - 2
+            self._place(index, LineCommand, self.points[index], self.points[index + 1])
 
         status = self._get_execution_status(final)
         if status == CommandStatus.SUCCESS and self.measure:
@@ -143,7 +226,7 @@ class AngleCommand(ComplexCommand):
 
     def _print_angle_label(self, angle):
         loc = self._calculate_label_location()
-        text_command = TextCommand(self.canvas, angle, self.color, loc)
+        text_command = TextCommand(self.canvas, angle, self.color, loc, self.tag)
         text_command.execute()
         self.commands.append(text_command)
 
@@ -160,7 +243,7 @@ class AngleCommand(ComplexCommand):
 
 
 class RectangleCommand(ComplexCommand):
-    def __init__(self, canvas, color, pixel_spacing, rescale_factor, with_measurement=True):
+    def __init__(self, canvas, color, pixel_spacing, rescale_factor, with_measurement=True, statistics=None):
         ComplexCommand.__init__(self, canvas)
         self.color = color
         self.points = []
@@ -168,10 +251,14 @@ class RectangleCommand(ComplexCommand):
         self.pixel_spacing = pixel_spacing
         self.rescale_factor = rescale_factor
         self.measure = with_measurement
+        self.statistics = statistics
 
     class RectCommand(Command):
-        def __init__(self, canvas, point1, point2, color):
+        on_canvas = True
+
+        def __init__(self, canvas, point1, point2, color, tag=None):
             self.canvas = canvas
+            self.tag = tag if tag is not None else command_tag()
             self.color = color
             self.point1 = point1
             self.point2 = point2
@@ -179,31 +266,19 @@ class RectangleCommand(ComplexCommand):
 
         def execute(self):
             self.id = self.canvas.create_rectangle(self.point1[0], self.point1[1], self.point2[0], self.point2[1],
-                                                   outline=self.color, width=3)
+                                                   outline=self.color, width=3, tags=(ANNOTATION_TAG, self.tag))
+
+        def move(self, point1, point2):
+            self.point1, self.point2 = point1, point2
+            self.canvas.coords(self.id, point1[0], point1[1], point2[0], point2[1])
 
         def undo(self):
             self.canvas.delete(self.id)
 
     def add_point(self, point, final=False):
-        if final:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            self.confirmed += 1
-            if len(self.points) == 2:
-                command = self.RectCommand(self.canvas, self.points[0], self.points[1], self.color)
-                command.execute()
-                self.commands.append(command)
-        else:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            if len(self.points) == 2:
-                command = self.RectCommand(self.canvas, self.points[0], self.points[1], self.color)
-                command.execute()
-                self.commands.append(command)
+        self._set_point(point, final)
+        if len(self.points) == 2:
+            self._place(0, self.RectCommand, self.points[0], self.points[1])
         status = self._get_execution_status(final)
         if status == CommandStatus.SUCCESS and self.measure:
             self._print_label()
@@ -235,7 +310,11 @@ class RectangleCommand(ComplexCommand):
         area = round(self._calculate_area(), 2)
         perimeter = round(self._calculate_perimeter(), 2)
         text = "Area: {} mm2\nPerim.: {} mm".format(area, perimeter)
-        text_command = TextCommand(self.canvas, text, self.color, loc)
+        statistics = _statistics_text(self.statistics, RECTANGLE, self.points)
+        if statistics:
+            text += statistics
+            loc = (loc[0], loc[1] + STATISTICS_LINE_OFFSET * statistics.count('\n'))
+        text_command = TextCommand(self.canvas, text, self.color, loc, self.tag)
         text_command.execute()
         self.commands.append(text_command)
 
@@ -251,7 +330,7 @@ class RectangleCommand(ComplexCommand):
 
 
 class EllipseCommand(ComplexCommand):
-    def __init__(self, canvas, color, pixel_spacing, rescale_factor, with_measurement=True):
+    def __init__(self, canvas, color, pixel_spacing, rescale_factor, with_measurement=True, statistics=None):
         ComplexCommand.__init__(self, canvas)
         self.color = color
         self.points = []
@@ -259,10 +338,14 @@ class EllipseCommand(ComplexCommand):
         self.pixel_spacing = pixel_spacing
         self.rescale_factor = rescale_factor
         self.measure = with_measurement
+        self.statistics = statistics
 
     class OvalCommand(Command):
-        def __init__(self, canvas, point1, point2, color):
+        on_canvas = True
+
+        def __init__(self, canvas, point1, point2, color, tag=None):
             self.canvas = canvas
+            self.tag = tag if tag is not None else command_tag()
             self.color = color
             self.point1 = point1
             self.point2 = point2
@@ -270,31 +353,19 @@ class EllipseCommand(ComplexCommand):
 
         def execute(self):
             self.id = self.canvas.create_oval(self.point1[0], self.point1[1], self.point2[0], self.point2[1],
-                                              outline=self.color, width=3)
+                                              outline=self.color, width=3, tags=(ANNOTATION_TAG, self.tag))
+
+        def move(self, point1, point2):
+            self.point1, self.point2 = point1, point2
+            self.canvas.coords(self.id, point1[0], point1[1], point2[0], point2[1])
 
         def undo(self):
             self.canvas.delete(self.id)
 
     def add_point(self, point, final=False):
-        if final:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            self.confirmed += 1
-            if len(self.points) == 2:
-                command = self.OvalCommand(self.canvas, self.points[0], self.points[1], self.color)
-                command.execute()
-                self.commands.append(command)
-        else:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            if len(self.points) == 2:
-                command = self.OvalCommand(self.canvas, self.points[0], self.points[1], self.color)
-                command.execute()
-                self.commands.append(command)
+        self._set_point(point, final)
+        if len(self.points) == 2:
+            self._place(0, self.OvalCommand, self.points[0], self.points[1])
         status = self._get_execution_status(final)
         if status == CommandStatus.SUCCESS and self.measure:
             self._print_label()
@@ -326,7 +397,11 @@ class EllipseCommand(ComplexCommand):
         area = round(self._calculate_area(), 2)
         perimeter = round(self._calculate_perimeter(), 2)
         text = "Area: {} mm2\nPerim.: {} mm".format(area, perimeter)
-        text_command = TextCommand(self.canvas, text, self.color, loc)
+        statistics = _statistics_text(self.statistics, ELLIPSE, self.points)
+        if statistics:
+            text += statistics
+            loc = (loc[0], loc[1] + STATISTICS_LINE_OFFSET * statistics.count('\n'))
+        text_command = TextCommand(self.canvas, text, self.color, loc, self.tag)
         text_command.execute()
         self.commands.append(text_command)
 
@@ -356,25 +431,9 @@ class DistanceCommand(ComplexCommand):
         self.measure = with_measurement
 
     def add_point(self, point, final=False):
-        if final:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            self.confirmed += 1
-            if len(self.points) == 2:
-                command = LineCommand(self.canvas, self.points[0], self.points[1], self.color)
-                command.execute()
-                self.commands.append(command)
-        else:
-            if len(self.points) > self.confirmed:
-                self.points.pop()
-                self.commands.pop().undo()
-            self.points.append(point)
-            if len(self.points) == 2:
-                command = LineCommand(self.canvas, self.points[0], self.points[1], self.color)
-                command.execute()
-                self.commands.append(command)
+        self._set_point(point, final)
+        if len(self.points) == 2:
+            self._place(0, LineCommand, self.points[0], self.points[1])
         status = self._get_execution_status(final)
         if status == CommandStatus.SUCCESS and self.measure:
             self._print_label()
@@ -408,7 +467,7 @@ class DistanceCommand(ComplexCommand):
         loc = self._calculate_label_location()
         length = round(self._calculate_length(), 2)
         text = "Length: {} mm".format(length)
-        text_command = TextCommand(self.canvas, text, self.color, loc)
+        text_command = TextCommand(self.canvas, text, self.color, loc, self.tag)
         text_command.execute()
         self.commands.append(text_command)
 
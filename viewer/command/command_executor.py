@@ -1,3 +1,4 @@
+from viewer.command.command import ANNOTATION_TAG
 
 
 class CommandExecutor:
@@ -35,7 +36,11 @@ class CommandExecutor:
             self.done.append(command)
 
     def reset(self):
-        self.undo_all()
+        # annotation items leave the canvas in one call, only commands holding state elsewhere are undone
+        self.canvas.delete(ANNOTATION_TAG)
+        for command in reversed(self.done):
+            if not command.on_canvas:
+                command.undo()
         self.clear()
 
     def undo_all(self):
@@ -0,0 +1,86 @@
+import contextlib
+import functools
+
+from pydicom.encaps import get_frame
+from pydicom.pixels import get_decoder, pixel_array
+from pydicom.uid import JPEG2000TransferSyntaxes
+
+from viewer.utils.cache import ByteLRUCache
+from viewer.utils.memory import PRIORITY_DECODE
+
+try:
+    import openjpeg
+except ImportError:
+    openjpeg = None
+
+# fastest first - pylibjpeg wraps libjpeg-turbo, CharLS, OpenJPEG and a compiled RLE decoder, pydicom's own
+# RLE decoder is plain numpy
+PLUGIN_PREFERENCE = ('pylibjpeg', 'gdcm', 'pillow', 'pydicom')
+DECODE_CACHE_BYTES = 512 * 1024 * 1024
+
+decode_cache = ByteLRUCache(DECODE_CACHE_BYTES, priority=PRIORITY_DECODE)
+
+
+def frame_count(dcm):
+    return int(dcm.get('NumberOfFrames', 1) or 1)
+
+
+def transfer_syntax(dcm):
+    return getattr(getattr(dcm, 'file_meta', None), 'TransferSyntaxUID', None)
+
+
+@functools.lru_cache(maxsize=None)
+def decoding_plugin(uid):
+    if uid is None:
+        return ''
+    try:
+        available = get_decoder(uid).available_plugins
+    except NotImplementedError:
+        return ''
+    for name in PLUGIN_PREFERENCE:
+        if name in available:
+            return name
+    return ''
+
+
+def cache_key(dcm, index=None):
+    uid = dcm.get('SOPInstanceUID')
+    return (str(uid), index) if uid else None
+
+
+def cached(dcm, index=None):
+    key = cache_key(dcm, index)
+    return key is not None and key in decode_cache
+
+
+def decode(dcm, index=None, lock=None):
+    # the lock only guards the decoder, a cache hit never waits for another thread's decode
+    key = cache_key(dcm, index)
+    pixels = decode_cache.get(key) if key is not None else None
+    if pixels is not None:
+        return pixels
+    with lock if lock is not None else contextlib.nullcontext():
+        pixels = decode_cache.get(key) if key is not None else None
+        if pixels is None:
+            pixels = pixel_array(dcm, index=index, decoding_plugin=decoding_plugin(transfer_syntax(dcm)))
+    if key is not None:
+        decode_cache.put(key, pixels)
+    return pixels
+
+
+def store(dcm, pixels, index=None):
+    key = cache_key(dcm, index)
+    if key is not None:
+        decode_cache.put(key, pixels)
+
+
+def decode_reduced(dcm, reduce, index=0):
+    # JPEG 2000 codestreams hold every power of two resolution, so a downscaled image is decoded
+    # without touching the full resolution data - returns None where that is not available
+    if openjpeg is None or reduce <= 0 or transfer_syntax(dcm) not in JPEG2000TransferSyntaxes:
+        return None
+    try:
+        frame = get_frame(dcm.PixelData, index, number_of_frames=frame_count(dcm))
+        return openjpeg.decode(frame, reduce=reduce)
+    except Exception:
+        return None
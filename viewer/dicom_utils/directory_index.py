@@ -0,0 +1,86 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pydicom
+from pydicom.errors import InvalidDicomError
+
+HEADER_WORKERS = 8
+
+
+def read_header(path):
+    try:
+        return pydicom.dcmread(path, stop_before_pixels=True)
+    except (InvalidDicomError, OSError, ValueError):
+        return None  # unreadable files are kept in the index but sorted last
+
+
+def slice_position(header):
+    position = header.get('ImagePositionPatient')
+    if position is None or len(position) != 3:
+        return 0.0
+    orientation = header.get('ImageOrientationPatient')
+    if orientation is None or len(orientation) != 6:
+        return float(position[2])
+    normal = np.cross([float(v) for v in orientation[:3]], [float(v) for v in orientation[3:]])
+    return float(np.dot(normal, [float(v) for v in position]))
+
+
+def _instance_number(header):
+    try:
+        return int(header.get('InstanceNumber'))
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def sort_key(path, header):
+    if header is None:
+        return 1, '', math.inf, 0.0, path
+    return 0, str(header.get('SeriesInstanceUID', '')), _instance_number(header), slice_position(header), path
+
+
+class DicomDirectoryIndex:
+    def __init__(self, path, workers=HEADER_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.mtime = None
+        self.paths = []
+        self.positions = {}
+        self.headers = {}
+
+    def refresh(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return False
+        with os.scandir(self.path) as entries:
+            paths = [self.path + entry.name for entry in entries if entry.name.endswith('.dcm') and entry.is_file()]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            headers = dict(zip(paths, pool.map(read_header, paths)))
+        self.paths = sorted(paths, key=lambda p: sort_key(p, headers[p]))
+        self.positions = {p: i for i, p in enumerate(self.paths)}
+        self.headers = headers
+        self.mtime = mtime
+        return True
+
+    def files(self):
+        self.refresh()
+        return self.paths
+
+    def header(self, path):
+        self.refresh()
+        return self.headers.get(path)
+
+    def position(self, path):
+        self.refresh()
+        return self.positions.get(path)
+
+
+_indexes = {}
+
+
+def directory_index(path):
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = DicomDirectoryIndex(path)
+    return index
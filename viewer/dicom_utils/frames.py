@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from viewer.dicom_utils.decoders import decode, cached, frame_count
+from viewer.dicom_utils.io import memmap_pixels
+
+READ_AHEAD = 8
+DEFAULT_FPS = 15.0
+
+
+def frame_rate(dcm):
+    for keyword in ('RecommendedDisplayFrameRate', 'CineRate'):
+        if dcm.get(keyword):
+            return float(dcm.get(keyword))
+    if dcm.get('FrameTime'):
+        return 1000.0 / float(dcm.FrameTime)
+    return DEFAULT_FPS
+
+
+class FrameSource:
+    def __init__(self, dcm, read_ahead=READ_AHEAD):
+        self.dcm = dcm
+        self.count = frame_count(dcm)
+        self.mapped = memmap_pixels(dcm)
+        self.read_ahead = read_ahead
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='frames')
+        self.pending = set()
+        self.lock = threading.Lock()  # pydicom datasets are not safe to decode from two threads at once
+
+    def frame(self, index):
+        if self.mapped is not None:
+            return self.mapped[index]  # native data - a frame is just a view into the mapping
+        pixels = self._decode(index)
+        self._read_ahead(index)
+        return pixels
+
+    def _decode(self, index):
+        return decode(self.dcm, index, self.lock)
+
+    def _read_ahead(self, index):
+        for i in range(index + 1, min(self.count, index + self.read_ahead + 1)):
+            if i not in self.pending and not cached(self.dcm, i):
+                self.pending.add(i)
+                self.pool.submit(self._decode, i).add_done_callback(lambda _, i=i: self.pending.discard(i))
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CinePlayer:
+    # frames are chosen from elapsed time, so when rendering falls behind frames are skipped rather than delayed
+    def __init__(self, widget, count, show_frame, fps=DEFAULT_FPS):
+        self.widget = widget
+        self.count = count
+        self.show_frame = show_frame
+        self.fps = fps
+        self.current = 0
+        self.job = None
+        self.start_time = None
+        self.start_frame = 0
+        self.shown = 0
+        self.dropped = 0
+
+    def playing(self):
+        return self.job is not None
+
+    def start(self, current=0):
+        self.current = current
+        self.start_frame = current
+        self.start_time = time.perf_counter()
+        self.shown = 0
+        self.dropped = 0
+        self._tick()
+
+    def stop(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+    def _tick(self):
+        elapsed = time.perf_counter() - self.start_time
+        step = int(elapsed * self.fps)
+        target = (self.start_frame + step) % self.count
+        if target != self.current:
+            self.dropped += (target - self.current) % self.count - 1
+            self.current = target
+            self.show_frame(target)
+            self.shown += 1
+        next_due = (step + 1) / self.fps - (time.perf_counter() - self.start_time)
+        self.job = self.widget.after(max(1, int(next_due * 1000)), self._tick)
+
+    def achieved_fps(self):
+        if self.start_time is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.start_time
+        return self.shown / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,48 @@
+import numpy as np
+
+from viewer.dicom_utils.lut import window_values
+
+HISTOGRAM_BINS = 4096
+AUTO_WINDOW_PERCENTILES = (1.0, 99.0)
+
+
+def _integer_counts(image):
+    values = image.ravel()
+    if image.dtype in (np.int8, np.int16):
+        # flipping the sign bit maps the signed range onto non-negative bincount indices in the same order
+        unsigned = np.uint8 if image.dtype == np.int8 else np.uint16
+        sign_bit = unsigned(1 << (image.dtype.itemsize * 8 - 1))
+        return np.bincount(values.view(unsigned) ^ sign_bit), -int(sign_bit)
+    return np.bincount(values), 0
+
+
+class Histogram:
+    def __init__(self, image):
+        if image.dtype in (np.uint8, np.uint16, np.int8, np.int16):
+            counts, first = _integer_counts(image)
+            nonzero = np.flatnonzero(counts)
+            counts = counts[nonzero[0]:nonzero[-1] + 1]
+            self.values = np.arange(len(counts)) + first + nonzero[0]
+        else:
+            counts, edges = np.histogram(image, bins=HISTOGRAM_BINS)
+            self.values = (edges[:-1] + edges[1:]) / 2.0
+            self.values[0], self.values[-1] = edges[0], edges[-1]
+        self.counts = counts
+        self.cumulative = np.cumsum(counts)
+        self.total = int(self.cumulative[-1])
+        self.minimum = self.values[0]
+        self.maximum = self.values[-1]
+
+    def percentile(self, q):
+        index = np.searchsorted(self.cumulative, q / 100.0 * self.total)
+        return self.values[min(index, len(self.values) - 1)]
+
+    def auto_window(self, percentiles=AUTO_WINDOW_PERCENTILES):
+        low, high = self.percentile(percentiles[0]), self.percentile(percentiles[1])
+        if high <= low:
+            low, high = self.minimum, self.maximum
+        return float(high - low) or 1.0, float(low + high) / 2.0
+
+    def windowed_mean(self, window_width, window_centre):
+        windowed = window_values(self.values, float(window_width), float(window_centre))
+        return np.dot(windowed, self.counts) / self.total
@@ -1,7 +1,18 @@
-import os
 from tkinter import filedialog
 
+import numpy as np
 import pydicom
+from pydicom.dataelem import RawDataElement
+from pydicom.multival import MultiValue
+from pydicom.uid import ImplicitVRLittleEndian, ExplicitVRLittleEndian
+
+from viewer.dicom_utils.decoders import decode, decoding_plugin, transfer_syntax, frame_count
+from viewer.dicom_utils.directory_index import directory_index
+
+
+DEFER_SIZE = '256 KB'
+PIXEL_DATA = 0x7FE00010
+MEMMAP_SYNTAXES = (ImplicitVRLittleEndian, ExplicitVRLittleEndian)
 
 
 def read_dicom(path=None):
@@ -10,9 +21,84 @@ def read_dicom(path=None):
                                         filetypes=(("DICOM files", "*.dcm"),))
     dcm = None
     if path != '':
-        dcm = pydicom.dcmread(path)
+        dcm = pydicom.dcmread(path, defer_size=DEFER_SIZE)
+        dcm.pixel_array_options(decoding_plugin=decoding_plugin(transfer_syntax(dcm)))
     return dcm, path
 
 
+def _native_dtype(dcm):
+    bits_allocated = int(dcm.get('BitsAllocated', 0))
+    if bits_allocated not in (8, 16, 32):
+        return None
+    signed = int(dcm.get('PixelRepresentation', 0)) == 1
+    return np.dtype('<{}{}'.format('i' if signed else 'u', bits_allocated // 8))
+
+
+def memmap_pixels(dcm):
+    if transfer_syntax(dcm) not in MEMMAP_SYNTAXES or not isinstance(dcm.filename, str):
+        return None
+    element = dcm.get_item(PIXEL_DATA, keep_deferred=True)
+    dtype = _native_dtype(dcm)
+    samples = int(dcm.get('SamplesPerPixel', 1))
+    if not isinstance(element, RawDataElement) or dtype is None or (samples > 1 and dcm.get('PlanarConfiguration')):
+        return None
+    frames = frame_count(dcm)
+    shape = (dcm.Rows, dcm.Columns) + ((samples,) if samples > 1 else ())
+    if frames > 1:
+        shape = (frames,) + shape
+    if element.length < np.prod(shape) * dtype.itemsize:
+        return None
+    pixels = np.memmap(dcm.filename, dtype=dtype, mode='r', offset=element.value_tell, shape=shape)
+    bits_stored = int(dcm.get('BitsStored', 0) or 0)
+    if 0 < bits_stored < dtype.itemsize * 8:
+        # values narrower than the container usually leave the high bits clear, or sign extended when signed -
+        # if the first frame shows otherwise, e.g. overlays in the high bits, leave the masking to pydicom
+        first = pixels[0] if frames > 1 else pixels
+        if dtype.kind == 'i':
+            limit = 1 << (bits_stored - 1)
+            if first.min() < -limit or first.max() >= limit:
+                return None
+        elif first.max() >= 1 << bits_stored:
+            return None
+    return pixels
+
+
+def pixel_data(dcm):
+    pixels = memmap_pixels(dcm)
+    return pixels if pixels is not None else decode(dcm)
+
+
+def first_frame(dcm):
+    # multi-frame objects are not decoded whole when only their first frame is shown
+    pixels = memmap_pixels(dcm)
+    if frame_count(dcm) == 1:
+        return pixels if pixels is not None else decode(dcm)
+    return pixels[0] if pixels is not None else decode(dcm, 0)
+
+
 def list_dicoms_from_dir(path):
-    return list(map(lambda name: path + name, filter(lambda file: file.endswith(".dcm"), os.listdir(path))))
+    return directory_index(path).files()
+
+
+def _first_value(value):
+    return float(value[0]) if isinstance(value, MultiValue) else float(value)
+
+
+def window_params(dcm):
+    try:
+        window_width, window_centre = _first_value(dcm.WindowWidth), _first_value(dcm.WindowCenter)
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return None, None  # missing or empty window tags - display falls back to auto window
+    if window_width <= 0:
+        return None, None
+    return window_width, window_centre
+
+
+def rescale_params(dcm):
+    try:
+        slope = float(dcm.get('RescaleSlope', 1) or 1)
+        intercept = float(dcm.get('RescaleIntercept', 0) or 0)
+    except (TypeError, ValueError):
+        slope, intercept = 1.0, 0.0
+    unit = dcm.get('RescaleType') or ('HU' if dcm.get('Modality') == 'CT' else '')
+    return slope, intercept, unit
@@ -0,0 +1,51 @@
+from functools import lru_cache
+
+import numpy as np
+
+MAX_LUT_BITS = 16
+
+
+def window_values(values, window_width, window_centre):
+    values = np.asarray(values, dtype=np.float64)
+    lower = window_centre - window_width / 2.0
+    upper = window_centre + window_width / 2.0
+    result = np.full(values.shape, 255, dtype=np.uint8)
+    result[values < lower] = 0
+    inside = (values >= lower) & (values <= upper)
+    if window_width > 0:
+        result[inside] = (values[inside] - window_centre + window_width / 2.0) / window_width * 255.0
+    else:
+        result[inside] = 0
+    return result
+
+
+@lru_cache(maxsize=32)
+def _build_lut(window_width, window_centre, bits, signed):
+    first = -(1 << (bits - 1)) if signed else 0
+    lut = window_values(np.arange(first, first + (1 << bits)), window_width, window_centre)
+    lut.setflags(write=False)
+    return lut, first
+
+
+def _lut_bits(image):
+    if not np.issubdtype(image.dtype, np.integer):
+        return None
+    bits = image.dtype.itemsize * 8
+    return bits if bits <= MAX_LUT_BITS else None
+
+
+def apply_window(image, window_width, window_centre, bits_stored=0):
+    # LUTs cover the whole container rather than bits_stored, so values with stray high bits are windowed like
+    # any other value instead of being clipped to the top of the stored range
+    window_width, window_centre = float(window_width), float(window_centre)
+    bits = _lut_bits(image)
+    if bits is None:
+        return window_values(image, window_width, window_centre)
+    if np.issubdtype(image.dtype, np.signedinteger):
+        # flipping the sign bit of the unsigned view indexes the LUT, so the indices stay in the image's own
+        # compact dtype instead of an upcast copy
+        lut, _ = _build_lut(window_width, window_centre, bits, True)
+        unsigned = np.dtype(image.dtype.str.replace('i', 'u'))
+        return np.take(lut, image.view(unsigned) ^ unsigned.type(1 << (bits - 1)))
+    lut, _ = _build_lut(window_width, window_centre, bits, False)
+    return np.take(lut, image)
@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from viewer.dicom_utils.decoders import store, frame_count
+from viewer.dicom_utils.io import read_dicom, first_frame
+from viewer.utils.cache import ByteLRUCache
+from viewer.utils.memory import PRIORITY_PREFETCH
+
+PREFETCH_DEPTH = 2
+PREFETCH_BYTES = 512 * 1024 * 1024
+PREFETCH_WORKERS = 2
+MAPPED_ENTRY_BYTES = 64 * 1024
+
+
+def decode(path):
+    start = time.perf_counter()
+    dcm = read_dicom(path)[0]
+    pixels = first_frame(dcm)  # multi-frame objects keep only frame 0, FrameSource decodes the rest lazily
+    return dcm, time.perf_counter() - start, pixels
+
+
+def decoded_size(entry):
+    # mapped pixel data lives in the page cache, so only the header counts against the budget
+    return MAPPED_ENTRY_BYTES if isinstance(entry[2], np.memmap) else entry[2].nbytes
+
+
+class SlicePrefetcher:
+    def __init__(self, depth=PREFETCH_DEPTH, max_bytes=PREFETCH_BYTES, workers=PREFETCH_WORKERS):
+        self.depth = depth
+        self.cache = ByteLRUCache(max_bytes, size_of=decoded_size, priority=PRIORITY_PREFETCH,
+                                  arrays_of=lambda entry: (entry[2],))
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.pending = {}
+        self.uncredited = set()  # prefetched paths whose decode time is not yet counted as hidden
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+        self.hidden_time = 0.0
+
+    def get(self, path):
+        entry = self.cache.get(path)
+        if entry is not None:
+            self.hits += 1
+            self._credit(path, entry[1])
+            return self._opened(entry)
+        with self.lock:
+            future = self.pending.get(path)
+        if future is not None and not future.cancelled():
+            start = time.perf_counter()
+            entry = future.result()
+            self.waits += 1
+            self._credit(path, max(0.0, entry[1] - (time.perf_counter() - start)))
+            return self._opened(entry)
+        self.misses += 1
+        entry = decode(path)
+        with self.lock:
+            self.uncredited.discard(path)
+        self.cache.put(path, entry)
+        return entry[0]
+
+    def _credit(self, path, hidden):
+        # each prefetch hides its decode once, later hits on the cached slice saved nothing more
+        with self.lock:
+            if path not in self.uncredited:
+                return
+            self.uncredited.discard(path)
+            self.hidden_time += hidden
+
+    def _opened(self, entry):
+        # the decode cache may have dropped these pixels since they were prefetched
+        if not isinstance(entry[2], np.memmap):
+            store(entry[0], entry[2], 0 if frame_count(entry[0]) > 1 else None)
+        return entry[0]
+
+    def prefetch_around(self, paths, index):
+        if index is None:
+            return
+        wanted = [paths[i] for i in sorted(range(max(0, index - self.depth), min(len(paths), index + self.depth + 1)),
+                                           key=lambda i: abs(i - index)) if i != index]
+        with self.lock:
+            for path, future in list(self.pending.items()):
+                if path not in wanted and future.cancel():
+                    del self.pending[path]
+                    self.uncredited.discard(path)
+            for path in wanted:
+                if path not in self.pending and path not in self.cache:
+                    future = self.pool.submit(decode, path)
+                    self.pending[path] = future
+                    self.uncredited.add(path)
+                    future.add_done_callback(self._get_cache_result(path))
+
+    def _get_cache_result(self, path):
+        def _cache_result(future):
+            with self.lock:
+                if self.pending.get(path) is future:
+                    del self.pending[path]
+            if not future.cancelled() and future.exception() is None:
+                self.cache.put(path, future.result())
+        return _cache_result
+
+    def stats(self):
+        lookups = self.hits + self.waits + self.misses
+        with self.lock:
+            pending = len(self.pending)
+        return {'depth': self.depth, 'hits': self.hits, 'waits': self.waits, 'misses': self.misses,
+                'hit_rate': (self.hits + self.waits) / lookups if lookups else 0.0,
+                'hidden_decode_time': self.hidden_time, 'pending': pending, 'cache': self.cache.stats()}
@@ -0,0 +1,121 @@
+import tkinter as tk
+from tkinter import ttk
+
+from pydicom.datadict import dictionary_VR, keyword_for_tag
+from pydicom.dataelem import RawDataElement
+
+BULK_VRS = {'OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'UN'}
+PIXEL_DATA = 0x7FE00010
+DEFAULT_ROW_HEIGHT = 20
+
+
+def format_tag(tag):
+    return '({:04X}, {:04X})'.format(tag.group, tag.element)
+
+
+def element_vr(tag, element):
+    if element.VR is not None:
+        return str(element.VR)
+    try:
+        return dictionary_VR(tag)
+    except KeyError:
+        return 'UN'
+
+
+def element_length(element):
+    if isinstance(element, RawDataElement):
+        return element.length
+    return len(element.value) if element.value is not None else 0
+
+
+def format_value(dataset, tag):
+    # get_item returns the raw element, so bulk values are measured without being converted or read
+    element = dataset.get_item(tag, keep_deferred=True)
+    vr = element_vr(tag, element)
+    if vr in BULK_VRS or tag == PIXEL_DATA:
+        return '<{} bytes>'.format(element_length(element))
+    if vr == 'SQ':
+        return '<{} items>'.format(len(dataset[tag].value))
+    return dataset[tag].repval
+
+
+class TagBrowser:
+    def __init__(self, master, height=24):
+        self.tree = ttk.Treeview(master, columns=('name', 'vr', 'value'), height=height)
+        self.tree.heading('#0', text='Tag')
+        self.tree.heading('name', text='Name')
+        self.tree.heading('vr', text='VR')
+        self.tree.heading('value', text='Value')
+        self.tree.column('#0', width=130, stretch=False)
+        self.tree.column('name', width=200, stretch=False)
+        self.tree.column('vr', width=40, stretch=False)
+        self.tree.column('value', width=400)
+        self.y_scrollbar = ttk.Scrollbar(master, orient=tk.VERTICAL, command=self.tree.yview)
+        self.x_scrollbar = ttk.Scrollbar(master, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(yscrollcommand=self._on_scroll, xscrollcommand=self.x_scrollbar.set)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.y_scrollbar.grid(row=0, column=1, sticky='ns')
+        self.x_scrollbar.grid(row=1, column=0, sticky='ew')
+        self.tree.bind('<<TreeviewOpen>>', self._expand)
+        self.tree.bind('<Configure>', lambda _: self._schedule_format())
+        self.elements = {}
+        self.sequence_items = {}
+        self.placeholders = set()
+        self.unformatted = set()
+        self.pending_format = None
+
+    def set_dataset(self, dataset):
+        self.tree.delete(*self.tree.get_children())
+        self.elements.clear()
+        self.sequence_items.clear()
+        self.placeholders.clear()
+        self.unformatted.clear()
+        self._insert_elements('', dataset)
+        self._schedule_format()
+
+    def _insert_elements(self, parent, dataset):
+        for tag in dataset.keys():
+            vr = element_vr(tag, dataset.get_item(tag, keep_deferred=True))
+            item = self.tree.insert(parent, tk.END, text=format_tag(tag), values=(keyword_for_tag(tag), vr, ''))
+            self.elements[item] = (dataset, tag)
+            self.unformatted.add(item)
+            if vr == 'SQ':
+                self._insert_placeholder(item)
+
+    def _insert_placeholder(self, parent):
+        self.placeholders.add(self.tree.insert(parent, tk.END, text='...'))
+
+    def _expand(self, event=None):
+        item = self.tree.focus()
+        children = self.tree.get_children(item)
+        if len(children) != 1 or children[0] not in self.placeholders:
+            return
+        self.placeholders.discard(children[0])
+        self.tree.delete(children[0])
+        if item in self.sequence_items:
+            self._insert_elements(item, self.sequence_items[item])
+        else:
+            dataset, tag = self.elements[item]
+            for index, sequence_item in enumerate(dataset[tag].value):
+                child = self.tree.insert(item, tk.END, text='Item {}'.format(index + 1), values=('', '', ''))
+                self.sequence_items[child] = sequence_item
+                self._insert_placeholder(child)
+        self._schedule_format()
+
+    def _on_scroll(self, first, last):
+        self.y_scrollbar.set(first, last)
+        self._schedule_format()
+
+    def _schedule_format(self):
+        if self.pending_format is None:
+            self.pending_format = self.tree.after_idle(self._format_visible)
+
+    def _format_visible(self):
+        self.pending_format = None
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or DEFAULT_ROW_HEIGHT)
+        for y in range(0, self.tree.winfo_height(), row_height):
+            item = self.tree.identify_row(y)
+            if item in self.unformatted:
+                self.unformatted.discard(item)
+                dataset, tag = self.elements[item]
+                self.tree.set(item, 'value', format_value(dataset, tag))
@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from viewer.dicom_utils.directory_index import slice_position, sort_key
+from viewer.dicom_utils.io import read_dicom, pixel_data
+from viewer.utils.memory import memory, buffer_size, PRIORITY_VOLUME
+
+AXIAL = 'axial'
+CORONAL = 'coronal'
+SAGITTAL = 'sagittal'
+PLANES = (AXIAL, CORONAL, SAGITTAL)
+
+
+def series_paths(index, series_uid):
+    paths = [path for path in index.files()
+             if index.header(path) is not None and index.header(path).get('SeriesInstanceUID') == series_uid]
+    return sorted(paths, key=lambda p: (slice_position(index.header(p)), sort_key(p, index.header(p))))
+
+
+def _slice_spacing(positions):
+    if len(positions) < 2:
+        return 1.0
+    return float(np.median(np.abs(np.diff(positions)))) or 1.0
+
+
+class Volume:
+    def __init__(self, array, pixel_spacing, slice_spacing):
+        self.array = array
+        self.pixel_spacing = pixel_spacing
+        self.slice_spacing = slice_spacing
+        memory.register(self, PRIORITY_VOLUME)
+
+    def memory_bytes(self, seen=None):
+        return buffer_size(self.array, seen=seen)
+
+    def release(self, nbytes):
+        return 0
+
+    def count(self, plane):
+        return self.array.shape[PLANES.index(plane)]
+
+    def stack(self, plane):
+        # reformats are views into the volume - slices are stored inferior to superior, so the slice axis is
+        # reversed to put superior at the top of coronal and sagittal images
+        if plane == AXIAL:
+            return self.array
+        if plane == CORONAL:
+            return self.array[::-1].transpose(1, 0, 2)
+        return self.array[::-1].transpose(2, 0, 1)
+
+    def slice(self, plane, index):
+        return self.stack(plane)[index]
+
+    def spacing(self, plane):
+        # (horizontal, vertical) spacing of the plane's images in mm, in the order the drawer measures with
+        if plane == AXIAL:
+            return self.pixel_spacing
+        if plane == CORONAL:
+            return self.pixel_spacing[1], self.slice_spacing
+        return self.pixel_spacing[0], self.slice_spacing
+
+
+def load_volume(index, series_uid, workers=None):
+    paths = series_paths(index, series_uid)
+    first = read_dicom(paths[0])[0]
+    first_pixels = pixel_data(first)
+    array = np.empty((len(paths),) + first_pixels.shape, dtype=first_pixels.dtype)
+    array[0] = first_pixels
+
+    def decode(i):
+        array[i] = pixel_data(read_dicom(paths[i])[0])
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        list(pool.map(decode, range(1, len(paths))))
+    positions = [slice_position(index.header(path)) for path in paths]
+    pixel_spacing = [float(v) for v in first.get('PixelSpacing', (1, 1))]
+    volume = Volume(array, pixel_spacing, _slice_spacing(positions))
+    memory.rebalance()
+    return volume
@@ -1,11 +1,46 @@
+import itertools
 import tkinter as tk
+from tkinter import messagebox
+import zlib
 
 import numpy as np
 from PIL import Image, ImageTk
 
+from viewer.dicom_utils.histogram import Histogram
+from viewer.dicom_utils.lut import apply_window
+from viewer.images.filter_executor import FilterExecutor
+from viewer.images.pyramid import ImagePyramid
+from viewer.images.roi import roi_statistics
+from viewer.images.transforms import TransformStack, is_geometric
+from viewer.utils.cache import ByteLRUCache
+from viewer.utils.memory import memory, buffer_size, PRIORITY_DISPLAY, PRIORITY_RENDER, PRIORITY_HISTORY
+
+RENDER_CACHE_BYTES = 64 * 1024 * 1024
+PHOTO_IMAGE_PIXEL_BYTES = 4
+HISTORY_BYTES = 16 * 1024 * 1024
+SNAPSHOT_COMPRESSION = 1
+
+_image_keys = itertools.count()
+
+
+def _compress(image):
+    return zlib.compress(np.ascontiguousarray(image), SNAPSHOT_COMPRESSION), image.shape, image.dtype
+
+
+def _filter_with_snapshots(image, filters, snapshot):
+    # runs on a worker - what each filter is applied to is compressed there too, so undo history follows the
+    # current window instead of the one the filter was pushed with
+    snapshots = []
+    for transform, args in filters:
+        if snapshot:
+            snapshots.append(_compress(image))
+        image = transform(image, **args)
+    return image, snapshots
+
 
 class DicomImageDisplay:
-    def __init__(self, canvas, with_window=True, print_window=False):
+    def __init__(self, canvas, with_window=True, print_window=False, cache_bytes=RENDER_CACHE_BYTES,
+                 priority=PRIORITY_DISPLAY):
         self.canvas = canvas
         self.image_id = None
         self.original_image = None
@@ -13,38 +48,97 @@ class DicomImageDisplay:
         self.window_width = None
         self.window_centre = None
         self.canvas_image = None
+        self.canvas_image_pixels = 0
         self.bits_stored = 0
         self.text_id = None
         self.with_window=with_window
         self.print_window=print_window
         self.prev_coords = None
         self.image_set = False
+        self.pyramid = None
+        self.pending_update = None
+        self.pending_key = None
+        self.image_key = None
+        self.series_key = None
+        self.transforms = TransformStack()
+        self.filter_executor = FilterExecutor(canvas)
+        self.render_cache = ByteLRUCache(cache_bytes, priority=PRIORITY_RENDER)
+        # one snapshot per stack depth, oldest dropped first - their filters are then undone by rendering again
+        self.snapshots = ByteLRUCache(HISTORY_BYTES, size_of=lambda snapshot: len(snapshot[0]),
+                                      priority=PRIORITY_HISTORY, fifo=True)
+        self.generation = 0
+        self.histogram = None
+        self.label_histogram = None
+        self.label_histogram_key = None
+        memory.register(self, priority)
+
+    def memory_bytes(self, seen=None):
+        arrays = [self.original_image, self.windowed_image]
+        if self.pyramid is not None:
+            arrays += self.pyramid.levels + [self.pyramid.display_image]
+        # may be called from worker threads, so the photo image's size is the one recorded when it was created
+        return buffer_size(*arrays, seen=seen) + self.canvas_image_pixels * PHOTO_IMAGE_PIXEL_BYTES
+
+    def release(self, nbytes):
+        return 0
 
     def set_default_image(self):
         self.canvas.update()
-        array_img = np.ndarray(self.canvas_dimensions())
-        color = 255
-        array_img.fill(color)
+        width, height = self.canvas_dimensions()
+        array_img = np.full((height, width), 255, dtype=np.uint8)
         self.original_image = array_img
+        self.windowed_image = None
+        self.pyramid = None
         self.canvas_image = self._np_array_to_image(array_img)
-        self.image_id = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.canvas_image)
+        if self.image_id is None:
+            self.image_id = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.canvas_image)
+        else:
+            self.canvas.itemconfig(self.image_id, image=self.canvas_image)
         self.image_set = False
 
-    def set_image(self, image, window_width, window_centre, bits_stored):
+    def set_image(self, image, window_width, window_centre, bits_stored, key=None):
+        # key identifies the pixels across calls, e.g. the SOP instance, so returning to an image hits the render
+        # cache - images without one get a key of their own
         self.canvas.update()
         self.bits_stored = bits_stored
         self.original_image = image
+        self.pyramid = ImagePyramid(image, self.canvas_dimensions())
+        self.image_key = self.series_key = key if key is not None else next(_image_keys)
+        self.filter_executor.cancel()
+        self.transforms.clear()
+        self.snapshots.clear()
+        self.generation += 1
+        self.histogram = Histogram(image)
+        self.label_histogram = None
+        if window_width is None or window_centre is None:
+            window_width, window_centre = self.histogram.auto_window()
         if self.with_window:
             self._set_window_params(window_width, window_centre)
         self._update_image()
         self.image_set = True
+        memory.rebalance()
 
-    def _set_window_params(self, window_width=None, window_centre=None):
+    def set_frame(self, image, index):
+        # frames share the window, transforms and histogram of the image passed to set_image
+        if not self.image_set:
+            return
+        self.original_image = image
+        self.pyramid = ImagePyramid(image, self.canvas_dimensions())
+        self.image_key = (self.series_key, index)
+        self.filter_executor.cancel()
+        self.label_histogram = None
+        self._update_image()
+        memory.rebalance()
+
+    def _set_window_params(self, window_width=None, window_centre=None, interactive=False):
         if window_width is not None:
             self.window_width = window_width
         if window_centre is not None:
             self.window_centre = window_centre
-        self._update_image()
+        if interactive:
+            self._schedule_interactive_update()
+        else:
+            self._update_image()
 
     def update_window_params(self, event):
         if not self.image_set:
@@ -54,20 +148,41 @@ class DicomImageDisplay:
             self.prev_coords = (x, y)
         elif self.prev_coords is not None:
             new_params = self._coords_to_window_params((x, y))
-            self._set_window_params(*new_params)
             if event.type == '5' and event.num == 1:
                 self.prev_coords = None
+                self._cancel_interactive_update()
+                self._set_window_params(*new_params)
             else:
                 self.prev_coords = (x, y)
+                self._set_window_params(*new_params, interactive=True)
 
     def _coords_to_window_params(self, coords):
         dx = coords[0] - self.prev_coords[0]
         dy = coords[1] - self.prev_coords[1]
         return self.window_width + 2 * dx, self.window_centre + 2 * dy
 
-    def _update_image(self):
-        self.windowed_image = self._apply_window(self.original_image)
-        self.canvas_image = self._np_array_to_image(self.windowed_image)
+    def _schedule_interactive_update(self):
+        # motion events queued before the idle callback only update window params, so just the latest is rendered
+        if self.pending_update is None:
+            self.pending_update = self.canvas.after_idle(self._interactive_update)
+
+    def _cancel_interactive_update(self):
+        if self.pending_update is not None:
+            self.canvas.after_cancel(self.pending_update)
+            self.pending_update = None
+
+    def _interactive_update(self):
+        self.pending_update = None
+        self._update_image(interactive=True)
+
+    def _update_image(self, interactive=False, rendered=None):
+        if rendered is None:
+            rendered = self._render(interactive)
+        if rendered is None:
+            return  # filters are running in the background, the last frame stays until they are done
+        self.windowed_image = rendered
+        self.canvas_image = self._np_array_to_image(self.windowed_image,
+                                                    resample=Image.NEAREST if interactive else None)
         self.canvas.itemconfig(self.image_id, image=self.canvas_image)
         if self.with_window and self.print_window:
             text = "L: {:.2f}\nW: {:.2f}".format(round(self.window_centre, 2), round(self.window_width), 2)
@@ -78,49 +193,147 @@ class DicomImageDisplay:
             else:
                 self.canvas.itemconfig(self.text_id, text=text, font=('Consolas', 12), fill=color)
 
+    def _render_key(self, interactive, depth=None):
+        return (self.image_key, self.window_width, self.window_centre, self.transforms.key()[:depth],
+                self.canvas_dimensions(), interactive)
+
+    def _render(self, interactive):
+        key = self._render_key(interactive)
+        rendered = self.render_cache.get(key)
+        if rendered is not None:
+            return rendered
+        filters = self.transforms.filters()
+        if not filters:
+            rendered = self._apply_window(self._transformed_source(interactive))
+            self.render_cache.put(key, rendered)
+            return rendered
+        if key == self.pending_key and self.filter_executor.busy():
+            return None
+        # the stack below a newly pushed filter is usually cached, then only that filter has to run
+        depths = [depth for depth, (transform, _) in enumerate(self.transforms.entries) if not is_geometric(transform)]
+        source = None
+        if not is_geometric(self.transforms.entries[-1][0]):
+            source = self.render_cache.get(self._render_key(interactive, depth=-1))
+        if source is not None:
+            filters, depths = filters[-1:], depths[-1:]
+        else:
+            source = self._apply_window(self._transformed_source(interactive))
+        positions = [(depth, self._render_key(interactive, depth)) for depth in depths]
+        self.pending_key = key
+        self.filter_executor.submit(_filter_with_snapshots, self._get_filter_done(key, interactive, positions),
+                                    source, filters, not interactive, error_callback=self._filter_failed)
+        return None
+
+    def _transformed_source(self, interactive):
+        self.pyramid.resize(self.canvas_dimensions())
+        source = self.pyramid.interactive() if interactive else self.pyramid.display()
+        return self.transforms.warp(source, border_value=float(self.histogram.minimum))
+
     def _calculate_params_label_location(self):
         x, y = self.canvas_dimensions()
         return x - 50, y - 25
 
+    def _get_label_histogram(self):
+        dimensions = self.canvas_dimensions()
+        key = (dimensions, self.transforms.key())
+        if self.label_histogram is None or self.label_histogram_key != key:
+            x, y = dimensions
+            source = self._transformed_source(interactive=False)
+            xi, yi = source.shape[1], source.shape[0]
+            self.label_histogram = Histogram(source[int(yi - (50.0 * yi / y)):, int(xi - (100.0 * xi / x)):])
+            self.label_histogram_key = key
+        return self.label_histogram
+
     def _calculate_params_label_text_color(self):
-        x, y = self.canvas_dimensions()
-        xi, yi = self.windowed_image.shape[1], self.windowed_image.shape[0]
-        avg = np.mean(self.windowed_image[int(yi - (50.0 * yi / y)):, int(xi - (100.0 * xi / x)):])
+        avg = self._get_label_histogram().windowed_mean(self.window_width, self.window_centre)
         return '#ffffff' if avg < 150 else '#000000'
 
-    def _np_array_to_image(self, img):
-        image = Image.fromarray(img).resize(self.canvas_dimensions())
+    def _np_array_to_image(self, img, resample=None):
+        image = Image.fromarray(img).resize(self.canvas_dimensions(), resample=resample)
+        self.canvas_image_pixels = image.size[0] * image.size[1]
         imagetk = ImageTk.PhotoImage(image=image)
         return imagetk
 
-    def _map_pixel(self, pixel, window_width, window_centre):
-        if pixel < window_centre - window_width / 2.0:
-            return 0.0
-        if pixel > window_centre + window_width / 2.0:
-            return 255.0
-        return (pixel - window_centre + window_width / 2.0) / window_width * 255.0
-
     def _apply_window(self, image):
         if not self.with_window:
-            return image
-        else:
-            img = np.ndarray(image.shape).astype(np.uint8)
-            for i in range(len(image)):
-                for j in range(len(image[i])):
-                    img[i][j] = self._map_pixel(image[i][j], self.window_width, self.window_centre)
-            return img
+            if image.dtype == np.uint8:
+                return image
+            return apply_window(image, *self.histogram.auto_window(), self.bits_stored)
+        return apply_window(image, self.window_width, self.window_centre, self.bits_stored)
+
+    def canvas_to_image_matrix(self):
+        # the display source is stretched over the canvas and warped by the geometric transforms, so undo both
+        # and scale from the display source up to the original image
+        self.pyramid.resize(self.canvas_dimensions())
+        source = self.pyramid.display()
+        width, height = self.canvas_dimensions()
+        to_source = np.diag((source.shape[1] / width, source.shape[0] / height, 1.0))
+        to_original = np.diag((self.original_image.shape[1] / source.shape[1],
+                               self.original_image.shape[0] / source.shape[0], 1.0))
+        return to_original @ np.linalg.inv(self.transforms.matrix(source.shape)) @ to_source
+
+    def roi_statistics(self, kind, point1, point2, slope=1.0, intercept=0.0):
+        if not self.image_set:
+            return None
+        return roi_statistics(self.original_image, kind, point1, point2, self.canvas_to_image_matrix(), slope,
+                              intercept)
 
     def canvas_dimensions(self):
         return self.canvas.winfo_width(), self.canvas.winfo_height()
 
-    def _apply_transform(self, transform, **transform_args):
-        self.original_image = transform(self.windowed_image, **transform_args)
-        self.windowed_image = self.original_image
-        self.canvas_image = self._np_array_to_image(self.windowed_image)
-        self.canvas.itemconfig(self.image_id, image=self.canvas_image)
+    def push_transform(self, transform, **transform_args):
+        if not self.image_set:
+            return
+        if is_geometric(transform):
+            self.transforms.push(transform, **transform_args)
+            self._update_image()
+            return
+        # the stack is updated at once so history stays in order, the filter itself runs in the background
+        key = self._render_key(interactive=False)
+        current = self.render_cache.get(key)
+        if current is not None:
+            self._store_snapshot(len(self.transforms), key, _compress(current))
+        self.transforms.push(transform, **transform_args)
+        self._update_image()
+
+    def _get_filter_done(self, key, interactive, positions):
+        generation = self.generation
+
+        def done(result):
+            filtered, snapshots = result
+            self.pending_key = None
+            if generation == self.generation:
+                for (depth, parameters), snapshot in zip(positions, snapshots):
+                    self._store_snapshot(depth, parameters, snapshot)
+            self.render_cache.put(key, filtered)
+            if self._render_key(interactive) == key:
+                self._update_image(interactive, filtered)  # shown directly, the cache may not keep it
+        return done
+
+    def _filter_failed(self, error):
+        self.pending_key = None
+        messagebox.showerror('Filter failed', str(error))
+
+    def pop_transform(self):
+        # geometric entries need no pixels to undo, the remaining stack composes to the inverse - a filter is
+        # undone from the compressed snapshot of what it was applied to, when that is still in the history
+        if not self.image_set or len(self.transforms) == 0:
+            return
+        self.transforms.pop()
+        key = self._render_key(interactive=False)
+        if key not in self.render_cache:
+            snapshot = self._load_snapshot(key)
+            if snapshot is not None:
+                self.render_cache.put(key, snapshot)
+        self._update_image()
+
+    def _store_snapshot(self, depth, parameters, snapshot):
+        # keyed by the history position, the render parameters are kept to tell whether it still applies
+        self.snapshots.put((self.generation, depth), snapshot + (parameters,))
 
-    def get_apply_transform(self, transform, **transform_args):
-        def fun():
-            if self.image_set:
-                self._apply_transform(transform, **transform_args)
-        return fun
+    def _load_snapshot(self, parameters):
+        snapshot = self.snapshots.get((self.generation, len(self.transforms)))
+        if snapshot is None or snapshot[3] != parameters:
+            return None
+        data, shape, dtype, _ = snapshot
+        return np.frombuffer(zlib.decompress(data), dtype=dtype).reshape(shape)
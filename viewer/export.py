@@ -0,0 +1,197 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from viewer.dicom_utils.histogram import Histogram
+from viewer.dicom_utils.io import read_dicom, window_params, first_frame, list_dicoms_from_dir
+from viewer.dicom_utils.lut import apply_window
+from viewer.images.edits.blur import mean, gaussian
+from viewer.images.edits.edge import canny, sobel, laplacian
+from viewer.images.edits.rotation import rotate, flip
+from viewer.images.transforms import TransformStack
+
+EDITS = {
+    'median': (mean, {}),
+    'gaussian': (gaussian, {}),
+    'canny': (canny, {}),
+    'sobel': (sobel, {}),
+    'laplacian': (laplacian, {}),
+    'rotate-right': (rotate, {'angle': -90}),
+    'rotate-left': (rotate, {'angle': 90}),
+    'flip-horizontal': (flip, {'flip_type': 1}),
+    'flip-vertical': (flip, {'flip_type': 0}),
+}
+FORMATS = {'png': '.png', 'jpeg': '.jpg'}
+JPEG_QUALITY = 95
+REPORT_INTERVAL = 0.25
+MANIFEST_NAME = '.export-manifest.json'
+
+EXPORTED = 'exported'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def find_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(list_dicoms_from_dir(os.path.join(pattern, '')))
+        else:
+            paths.extend(path for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path))
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def output_paths(paths, output_dir, extension):
+    # keep the layout below the inputs' common directory so files from different folders do not collide
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.join(output_dir, os.path.splitext(os.path.relpath(path, root))[0] + extension) for path in paths]
+
+
+def render_params(window, edits, image_format):
+    params = [list(window) if window is not None else None, list(edits), image_format]
+    if image_format == 'jpeg':
+        params.append(JPEG_QUALITY)
+    return hashlib.sha1(json.dumps(params).encode()).hexdigest()
+
+
+def read_manifest(output_dir):
+    # maps each output, relative to the output directory, to the hash of the parameters it was rendered with
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(path + '.partial', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.partial', path)
+
+
+def is_up_to_date(source, target, params, manifest, output_dir):
+    return (os.path.exists(target) and os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns
+            and manifest.get(os.path.relpath(target, output_dir)) == params)
+
+
+def render(dcm, window=None, edits=()):
+    pixels = first_frame(dcm)
+    transforms = TransformStack()
+    for name in edits:
+        transform, args = EDITS[name]
+        transforms.push(transform, **args)
+    histogram = Histogram(pixels)
+    window_width, window_centre = window if window is not None else window_params(dcm)
+    if window_width is None:
+        window_width, window_centre = histogram.auto_window()
+    warped = transforms.warp(pixels, border_value=histogram.minimum)
+    return transforms.filter(apply_window(warped, window_width, window_centre, int(dcm.get('BitsStored', 0) or 0)))
+
+
+def export_file(source, target, window=None, edits=(), image_format='png'):
+    try:
+        image = render(read_dicom(source)[0], window, edits)
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if image_format == 'jpeg' else []
+        ok, encoded = cv2.imencode(FORMATS[image_format], image, params)
+        if not ok:
+            raise ValueError('could not encode {}'.format(target))
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        # written next to the target and renamed, so an interrupted run never leaves a truncated output
+        # that a resumed run would take as up to date
+        partial = target + '.partial'
+        with open(partial, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(partial, target)
+    except Exception as e:
+        return source, FAILED, str(e)
+    return source, EXPORTED, None
+
+
+def _report(done, total, start, counts):
+    elapsed = time.perf_counter() - start
+    rate = counts[EXPORTED] / elapsed if elapsed > 0 else 0.0
+    sys.stderr.write('\r{}/{} files, {} exported, {} skipped, {} failed, {:.1f} files/s'
+                     .format(done, total, counts[EXPORTED], counts[SKIPPED], counts[FAILED], rate))
+    sys.stderr.flush()
+
+
+def export(paths, output_dir, window=None, edits=(), image_format='png', workers=None, force=False, verbose=True):
+    counts = {EXPORTED: 0, SKIPPED: 0, FAILED: 0}
+    failures = []
+    start = time.perf_counter()
+    if not paths:
+        return counts, failures, 0.0
+    targets = output_paths(paths, output_dir, FORMATS[image_format])
+    params = render_params(window, edits, image_format)
+    manifest = read_manifest(output_dir)
+    pending = {}
+    for source, target in zip(paths, targets):
+        if not force and is_up_to_date(source, target, params, manifest, output_dir):
+            counts[SKIPPED] += 1
+        else:
+            pending[source] = target
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(export_file, source, target, window, edits, image_format)
+                       for source, target in pending.items()]
+            reported = 0.0
+            for done, future in enumerate(as_completed(futures), counts[SKIPPED] + 1):
+                source, status, error = future.result()
+                counts[status] += 1
+                if error is not None:
+                    failures.append((source, error))
+                else:
+                    manifest[os.path.relpath(pending[source], output_dir)] = params
+                if verbose and (done == len(paths) or time.perf_counter() - reported >= REPORT_INTERVAL):
+                    reported = time.perf_counter()
+                    _report(done, len(paths), start, counts)
+    finally:
+        # written even when interrupted, so a resumed run skips what was finished
+        if pending:
+            write_manifest(output_dir, manifest)
+    if verbose and pending:
+        sys.stderr.write('\n')
+    return counts, failures, time.perf_counter() - start
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Render DICOM files to 8-bit PNG or JPEG images.')
+    parser.add_argument('inputs', nargs='+', help='DICOM directories or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='output directory')
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS), default='png')
+    parser.add_argument('-w', '--window', nargs=2, type=float, metavar=('WIDTH', 'CENTRE'),
+                        help='window to use instead of the one stored in the files')
+    parser.add_argument('-e', '--edit', action='append', choices=sorted(EDITS), default=[],
+                        help='edit to apply, may be repeated and is applied in order')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--force', action='store_true', help='export files whose output is up to date as well')
+    args = parser.parse_args(argv)
+    if args.window is not None and args.window[0] <= 0:
+        parser.error('window width must be positive')
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    paths = find_inputs(args.inputs)
+    counts, failures, elapsed = export(paths, args.output, args.window, args.edit, args.format, args.workers,
+                                       args.force)
+    for source, error in failures:
+        print('{}: {}'.format(source, error), file=sys.stderr)
+    rate = counts[EXPORTED] / elapsed if elapsed > 0 else 0.0
+    print('{} exported, {} skipped, {} failed in {:.2f} s ({:.1f} files/s)'
+          .format(counts[EXPORTED], counts[SKIPPED], counts[FAILED], elapsed, rate))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
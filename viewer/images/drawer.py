@@ -2,6 +2,8 @@ from viewer.command.command import LineCommand, ComplexCommand, AngleCommand, Re
     DistanceCommand, CurveCommand
 from viewer.command.status import CommandStatus
 
+MOTION_EVENT = '6'
+
 
 class Drawer:
     def __init__(self, canvas, executor, pixel_spacing=None, rescale_factor=None):
@@ -11,7 +13,34 @@ class Drawer:
         self.pixel_spacing = pixel_spacing if pixel_spacing is not None else [1, 1]
         self.rescale_factor = rescale_factor if rescale_factor is not None else [1, 1]
         self.measure = False
+        self.statistics = None
+        self.confirmed = None
         self.draw_command = None
+        self.pending_motion = None
+        self.pending_job = None
+
+    def _coalesce(self, handler, event):
+        # motion only moves the rubber band, so queued motion events collapse into the latest one, handled
+        # when Tk is idle - presses and releases first apply any motion still pending
+        if event.type == MOTION_EVENT:
+            self.pending_motion = (handler, event)
+            if self.pending_job is None:
+                self.pending_job = self.canvas.after_idle(self._handle_pending_motion)
+            return
+        self._flush_motion()
+        handler(event)
+
+    def _handle_pending_motion(self):
+        self.pending_job = None
+        if self.pending_motion is not None:
+            handler, event = self.pending_motion
+            self.pending_motion = None
+            handler(event)
+
+    def _flush_motion(self):
+        if self.pending_job is not None:
+            self.canvas.after_cancel(self.pending_job)
+        self._handle_pending_motion()
 
     def draw_curve(self, event):
         x, y = event.x, event.y
@@ -23,16 +52,25 @@ class Drawer:
                 self.draw_command = CurveCommand(self.canvas, self.color)
                 r = self.draw_command.add_point((x, y))
         if r == CommandStatus.SUCCESS:
-            self.executor.add(self.draw_command)
+            self._confirm()
             self.reset()
         elif r == CommandStatus.FAIL:
             self.draw_command.undo()
             self.reset()
 
+    def _confirm(self):
+        if self.confirmed is not None:
+            self.confirmed(self.draw_command)
+        self.executor.add(self.draw_command)
+
     def reset(self):
         self.draw_command = None
+        self.pending_motion = None
 
     def draw_angle(self, event):
+        self._coalesce(self._draw_angle, event)
+
+    def _draw_angle(self, event):
         x, y = event.x, event.y
         r = None
         if self.draw_command is not None:
@@ -44,13 +82,16 @@ class Drawer:
                 _ = self.draw_command.add_point((x, y), final=True)
                 r = self.draw_command.add_point((x, y))
         if r == CommandStatus.SUCCESS:
-            self.executor.add(self.draw_command)
+            self._confirm()
             self.reset()
         elif r == CommandStatus.FAIL:
             self.draw_command.undo()
             self.reset()
 
     def draw_rectangle(self, event):
+        self._coalesce(self._draw_rectangle, event)
+
+    def _draw_rectangle(self, event):
         x, y = event.x, event.y
         r = None
         if self.draw_command is not None:
@@ -58,17 +99,20 @@ class Drawer:
         else:
             if event.type == '4' and event.num == 1:
                 self.draw_command = RectangleCommand(self.canvas, self.color, self.pixel_spacing, self.rescale_factor,
-                                                     with_measurement=self.measure)
+                                                     with_measurement=self.measure, statistics=self.statistics)
                 _ = self.draw_command.add_point((x, y), final=True)
                 r = self.draw_command.add_point((x, y))
         if r == CommandStatus.SUCCESS:
-            self.executor.add(self.draw_command)
+            self._confirm()
             self.reset()
         elif r == CommandStatus.FAIL:
             self.draw_command.undo()
             self.reset()
 
     def draw_ellipse(self, event):
+        self._coalesce(self._draw_ellipse, event)
+
+    def _draw_ellipse(self, event):
         x, y = event.x, event.y
         r = None
         if self.draw_command is not None:
@@ -76,17 +120,20 @@ class Drawer:
         else:
             if event.type == '4' and event.num == 1:
                 self.draw_command = EllipseCommand(self.canvas, self.color, self.pixel_spacing, self.rescale_factor,
-                                                   with_measurement=self.measure)
+                                                   with_measurement=self.measure, statistics=self.statistics)
                 _ = self.draw_command.add_point((x, y), final=True)
                 r = self.draw_command.add_point((x, y))
         if r == CommandStatus.SUCCESS:
-            self.executor.add(self.draw_command)
+            self._confirm()
             self.reset()
         elif r == CommandStatus.FAIL:
             self.draw_command.undo()
             self.reset()
 
     def draw_line(self, event):
+        self._coalesce(self._draw_line, event)
+
+    def _draw_line(self, event):
         x, y = event.x, event.y
         r = None
         if self.draw_command is not None:
@@ -98,7 +145,7 @@ class Drawer:
                 _ = self.draw_command.add_point((x, y), final=True)
                 r = self.draw_command.add_point((x, y))
         if r == CommandStatus.SUCCESS:
-            self.executor.add(self.draw_command)
+            self._confirm()
             self.reset()
         elif r == CommandStatus.FAIL:
             self.draw_command.undo()
@@ -1,12 +1,26 @@
 import math
 
 import cv2
+import numpy as np
+
+
+def rotation_matrix(shape, angle):
+    matrix = cv2.getRotationMatrix2D((shape[1] // 2, shape[0] // 2), angle, 1)
+    return np.vstack((matrix, (0, 0, 1)))
+
+
+def flip_matrix(shape, flip_type):
+    matrix = np.eye(3)
+    if flip_type != 0:
+        matrix[0, 0], matrix[0, 2] = -1, shape[1] - 1
+    if flip_type <= 0:
+        matrix[1, 1], matrix[1, 2] = -1, shape[0] - 1
+    return matrix
 
 
 def rotate(image, angle):
     shape = (image.shape[1], image.shape[0])
-    rotation_matrix = cv2.getRotationMatrix2D((shape[0] // 2, shape[1] // 2), angle, 1)
-    return cv2.warpAffine(image, rotation_matrix, shape)
+    return cv2.warpAffine(image, rotation_matrix(image.shape, angle)[:2], shape)
 
 
 def flip(image, flip_type):
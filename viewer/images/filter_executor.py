@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL = 15  # ms
+WORKERS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    # every display submits to the same workers, so the previews do not each start threads of their own
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='filter')
+        return _pool
+
+
+class FilterExecutor:
+    # OpenCV releases the GIL while filtering, so jobs run on worker threads and only their
+    # results are handed back to the Tk thread, which is polled with after()
+    def __init__(self, widget, pool=None):
+        self.widget = widget
+        self.pool = pool if pool is not None else shared_pool()
+        self.generation = 0
+        self.future = None
+
+    def submit(self, function, callback, *args, error_callback=None, **kwargs):
+        self.cancel()
+        self.future = self.pool.submit(function, *args, **kwargs)
+        self._poll(self.future, self.generation, callback, error_callback)
+
+    def cancel(self):
+        self.generation += 1
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    def busy(self):
+        return self.future is not None
+
+    def _poll(self, future, generation, callback, error_callback):
+        if generation != self.generation:
+            return  # superseded by a newer job or cancelled - result is discarded
+        if not future.done():
+            self.widget.after(POLL_INTERVAL, self._poll, future, generation, callback, error_callback)
+            return
+        self.future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            if error_callback is not None:
+                error_callback(e)
+            return
+        callback(result)
+
+    def shutdown(self):
+        self.cancel()
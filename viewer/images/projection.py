@@ -0,0 +1,75 @@
+import numpy as np
+
+MIP = 'mip'
+MINIP = 'minip'
+AVERAGE = 'average'
+MAX_STALE_FRACTION = 0.25
+
+
+class SlabProjector:
+    def __init__(self, stack, mode, thickness):
+        self.stack = stack
+        self.mode = mode
+        self.thickness = max(1, min(thickness, len(stack)))
+        self.start = None
+        self.result = None
+        self.sum = None
+        self.ties = None  # per pixel, how many slices of the slab hold the extreme value
+
+    def project(self, index):
+        start = min(max(index - self.thickness // 2, 0), len(self.stack) - self.thickness)
+        if start != self.start:
+            if self.start is not None and abs(start - self.start) == 1:
+                self._shift(start)
+            else:
+                self._compute(start)
+            self.start = start
+        return self.result
+
+    def _slab(self, start):
+        return self.stack[start:start + self.thickness]
+
+    def _compute(self, start):
+        slab = self._slab(start)
+        if self.mode == AVERAGE:
+            self.sum = slab.sum(axis=0, dtype=np.float64 if slab.dtype.kind == 'f' else np.int64)
+            self.result = (self.sum / self.thickness).astype(np.float32)
+        else:
+            self.result = slab.max(axis=0) if self.mode == MIP else slab.min(axis=0)
+            self.ties = (slab == self.result).sum(axis=0, dtype=np.uint16)
+
+    def _shift(self, start):
+        # moving the slab by one slice only swaps one slice in and one out of the reduction
+        forward = start > self.start
+        outgoing = self.stack[self.start if forward else self.start + self.thickness - 1]
+        incoming = self.stack[start + self.thickness - 1 if forward else start]
+        if self.mode == AVERAGE:
+            self.sum += incoming
+            self.sum -= outgoing
+            self.result = (self.sum / self.thickness).astype(np.float32)
+            return
+        reduce, better, combine = (np.max, np.greater, np.maximum) if self.mode == MIP else \
+            (np.min, np.less, np.minimum)
+        # kept branch free - masked assignment and np.where are several times slower on scattered masks
+        ties = self.ties
+        ties += incoming == self.result
+        replaced = better(incoming, self.result)
+        np.multiply(ties, ~replaced, out=ties)
+        ties += replaced
+        result = combine(self.result, incoming)
+        ties -= outgoing == result
+        # only pixels where the last slice holding the extreme value left need the whole slab again - large
+        # uniform regions such as air keep other slices at the extreme
+        stale = ties == 0
+        count = np.count_nonzero(stale)
+        if count > stale.size * MAX_STALE_FRACTION:
+            self._compute(start)
+            return
+        if count:
+            # a flat index gather is much cheaper than boolean indexing across the slab
+            pixels = np.flatnonzero(stale)
+            slab = np.take(self._slab(start).reshape(self.thickness, -1), pixels, axis=1)
+            extreme = reduce(slab, axis=0)
+            result.ravel()[pixels] = extreme
+            ties.ravel()[pixels] = (slab == extreme).sum(axis=0, dtype=np.uint16)
+        self.result = result
@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+
+RESIZABLE_TYPES = (np.uint8, np.uint16, np.int16, np.float32, np.float64)
+
+
+def downsample(image, size):
+    if image.dtype.type in RESIZABLE_TYPES:
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    rows = np.linspace(0, image.shape[0] - 1, size[1]).astype(np.intp)
+    cols = np.linspace(0, image.shape[1] - 1, size[0]).astype(np.intp)
+    return image[rows[:, np.newaxis], cols]
+
+
+class ImagePyramid:
+    def __init__(self, image, dimensions):
+        self.levels = [image]
+        self.dimensions = None
+        self.display_image = None
+        self.resize(dimensions)
+
+    def resize(self, dimensions):
+        if dimensions == self.dimensions:
+            return
+        self.dimensions = dimensions
+        self.display_image = None
+        min_width, min_height = max(1, dimensions[0] // 2), max(1, dimensions[1] // 2)
+        while self.levels[-1].shape[1] // 2 >= min_width and self.levels[-1].shape[0] // 2 >= min_height:
+            level = self.levels[-1]
+            self.levels.append(downsample(level, (level.shape[1] // 2, level.shape[0] // 2)))
+
+    def level_for(self, dimensions):
+        for level in reversed(self.levels):
+            if level.shape[1] >= dimensions[0] and level.shape[0] >= dimensions[1]:
+                return level
+        return self.levels[0]
+
+    def display(self):
+        if self.display_image is None:
+            level = self.level_for(self.dimensions)
+            size = (min(level.shape[1], self.dimensions[0]), min(level.shape[0], self.dimensions[1]))
+            self.display_image = level if size == (level.shape[1], level.shape[0]) else downsample(level, size)
+        return self.display_image
+
+    def interactive(self):
+        return self.level_for((max(1, self.dimensions[0] // 2), max(1, self.dimensions[1] // 2)))
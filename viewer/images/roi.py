@@ -0,0 +1,66 @@
+import numpy as np
+
+RECTANGLE = 'rectangle'
+ELLIPSE = 'ellipse'
+STATISTICS_CHUNK = 1 << 16
+
+
+def _bounding_box(point1, point2, matrix, shape):
+    corners = np.array([(point1[0], point1[1], 1), (point2[0], point1[1], 1),
+                        (point1[0], point2[1], 1), (point2[0], point2[1], 1)], dtype=np.float64)
+    mapped = corners @ matrix.T
+    left, top = np.floor(mapped[:, :2].min(axis=0)).astype(int)
+    right, bottom = np.ceil(mapped[:, :2].max(axis=0)).astype(int)
+    return max(top, 0), min(bottom, shape[0]), max(left, 0), min(right, shape[1])
+
+
+def _canvas_axis(row, xs, ys, centre):
+    # without rotation each canvas axis depends on a single image axis and stays one dimensional
+    if row[1] == 0:
+        return (row[0] * xs + (row[2] - centre))[np.newaxis, :]
+    if row[0] == 0:
+        return (row[1] * ys + (row[2] - centre))[:, np.newaxis]
+    return (row[0] * xs)[np.newaxis, :] + (row[1] * ys + (row[2] - centre))[:, np.newaxis]
+
+
+def roi_mask(kind, point1, point2, matrix, shape):
+    # matrix maps canvas coordinates to image coordinates - pixel centres of the ROI's bounding box in the image
+    # are mapped back onto the canvas and tested against the shape drawn there, so only the box is touched
+    top, bottom, left, right = _bounding_box(point1, point2, matrix, shape)
+    if bottom <= top or right <= left:
+        return None
+    to_canvas = np.linalg.inv(matrix)
+    to_canvas[np.abs(to_canvas) < 1e-9] = 0  # right-angle rotations leave rounding noise where zeros belong
+    to_canvas = to_canvas.astype(np.float32)
+    xs = np.arange(left, right, dtype=np.float32) + 0.5
+    ys = np.arange(top, bottom, dtype=np.float32) + 0.5
+    centre_x, centre_y = (point1[0] + point2[0]) / 2.0, (point1[1] + point2[1]) / 2.0
+    radius_x, radius_y = abs(point2[0] - point1[0]) / 2.0, abs(point2[1] - point1[1]) / 2.0
+    u = _canvas_axis(to_canvas[0], xs, ys, centre_x) / np.float32(radius_x)
+    v = _canvas_axis(to_canvas[1], xs, ys, centre_y) / np.float32(radius_y)
+    if kind == ELLIPSE:
+        mask = u * u + v * v <= 1
+    else:
+        mask = (np.abs(u) <= 1) & (np.abs(v) <= 1)
+    return (slice(top, bottom), slice(left, right)), mask
+
+
+def roi_statistics(image, kind, point1, point2, matrix, slope=1.0, intercept=0.0):
+    region = roi_mask(kind, point1, point2, matrix, image.shape)
+    if region is None:
+        return None
+    box, mask = region
+    values = image[box][mask].ravel()
+    if values.size == 0:
+        return None
+    total, squares = 0.0, 0.0
+    for start in range(0, values.size, STATISTICS_CHUNK):
+        # converted in cache sized chunks rather than as one float64 copy of the whole ROI
+        chunk = values[start:start + STATISTICS_CHUNK].astype(np.float64)
+        total += chunk.sum()
+        squares += chunk @ chunk
+    mean = total / values.size
+    variance = max(squares / values.size - mean * mean, 0.0)
+    low, high = float(values.min()) * slope + intercept, float(values.max()) * slope + intercept
+    return {'mean': mean * slope + intercept, 'sd': np.sqrt(variance) * abs(slope),
+            'min': min(low, high), 'max': max(low, high), 'count': int(np.count_nonzero(mask))}
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from viewer.images.thumbnails import read_thumbnail, THUMBNAIL_SIZE
+from viewer.utils.paths import user_cache_dir
+
+STORE_NAME = 'thumbnails.sqlite'
+STORE_BYTES = 64 * 1024 * 1024
+
+
+class ThumbnailStore:
+    def __init__(self, path=None, max_bytes=STORE_BYTES, size=THUMBNAIL_SIZE):
+        self.path = path if path is not None else os.path.join(user_cache_dir(), STORE_NAME)
+        self.max_bytes = max_bytes
+        self.size = size
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS thumbnails (path TEXT PRIMARY KEY, file_size INTEGER, '
+                                'mtime INTEGER, thumbnail_size INTEGER, data BLOB, accessed REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS thumbnails_accessed ON thumbnails (accessed)')
+        self.bytes = self.connection.execute('SELECT COALESCE(SUM(LENGTH(data)), 0) FROM thumbnails').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, stat):
+        # entries written for another version of the file or thumbnail size never match and are replaced on put
+        row = self.connection.execute('SELECT data FROM thumbnails WHERE path = ? AND file_size = ? AND mtime = ? '
+                                      'AND thumbnail_size = ?', (path, stat.st_size, stat.st_mtime_ns,
+                                                                 self.size)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute('UPDATE thumbnails SET accessed = ? WHERE path = ?', (time.time(), path))
+        self.connection.commit()
+        return np.frombuffer(row[0], dtype=np.uint8).reshape(self.size, self.size)
+
+    def put(self, path, stat, thumbnail):
+        data = np.ascontiguousarray(thumbnail, dtype=np.uint8).tobytes()
+        old = self.connection.execute('SELECT LENGTH(data) FROM thumbnails WHERE path = ?', (path,)).fetchone()
+        self.connection.execute('INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?)',
+                                (path, stat.st_size, stat.st_mtime_ns, self.size, data, time.time()))
+        self.bytes += len(data) - (old[0] if old is not None else 0)
+        self._evict()
+        self.connection.commit()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes:
+            rows = self.connection.execute('SELECT path, LENGTH(data) FROM thumbnails ORDER BY accessed '
+                                           'LIMIT 64').fetchall()
+            if not rows:
+                break
+            for path, size in rows:
+                if self.bytes <= self.max_bytes:
+                    break
+                self.connection.execute('DELETE FROM thumbnails WHERE path = ?', (path,))
+                self.bytes -= size
+
+    def load(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        thumbnail = self.get(path, stat)
+        if thumbnail is None:
+            thumbnail = read_thumbnail(path, self.size)
+            self.put(path, stat, thumbnail)
+        return thumbnail
+
+    def close(self):
+        self.connection.close()
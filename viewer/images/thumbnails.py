@@ -0,0 +1,54 @@
+import math
+from collections import deque
+
+import cv2
+
+from viewer.dicom_utils.decoders import decode_reduced
+from viewer.dicom_utils.histogram import Histogram
+from viewer.dicom_utils.io import read_dicom, window_params, first_frame
+from viewer.dicom_utils.lut import apply_window
+
+THUMBNAIL_SIZE = 64
+MAX_REDUCTION = 5
+
+
+def _reduction(dcm, size):
+    smallest = min(int(dcm.get('Rows', 0) or 0), int(dcm.get('Columns', 0) or 0))
+    if smallest <= 2 * size:
+        return 0
+    return min(MAX_REDUCTION, int(math.log2(smallest / (2 * size))))
+
+
+def make_thumbnail(dcm, size=THUMBNAIL_SIZE):
+    pixels = decode_reduced(dcm, _reduction(dcm, size))
+    if pixels is None:
+        pixels = first_frame(dcm)
+    # keep about twice the thumbnail resolution so only a fraction of the pixels is windowed and resampled
+    step = max(1, min(pixels.shape[:2]) // (2 * size))
+    sample = pixels[::step, ::step]
+    window_width, window_centre = window_params(dcm)
+    if window_width is None:
+        window_width, window_centre = Histogram(sample).auto_window()
+    windowed = apply_window(sample, window_width, window_centre, int(dcm.get('BitsStored', 0) or 0))
+    return cv2.resize(windowed, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def read_thumbnail(path, size=THUMBNAIL_SIZE):
+    return make_thumbnail(read_dicom(path)[0], size)
+
+
+class ThumbnailRing:
+    def __init__(self, capacity, loader=read_thumbnail):
+        self.loader = loader
+        self.entries = deque(maxlen=capacity)
+        self.loads = 0
+
+    def update(self, paths):
+        current = dict(self.entries)
+        for path in paths:
+            if path not in current:
+                current[path] = self.loader(path)
+                self.loads += 1
+        self.entries.clear()
+        self.entries.extend((path, current[path]) for path in paths)
+        return [thumbnail for _, thumbnail in self.entries]
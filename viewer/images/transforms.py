@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+from viewer.images.edits.rotation import rotate, flip, rotation_matrix, flip_matrix
+
+WARPABLE_TYPES = (np.uint8, np.uint16, np.int16, np.float32, np.float64)
+MATRICES = {rotate: rotation_matrix, flip: flip_matrix}
+
+
+def is_geometric(transform):
+    return transform in MATRICES
+
+
+def apply_filters(image, filters):
+    for transform, args in filters:
+        image = transform(image, **args)
+    return image
+
+
+def _is_axis_aligned(matrix):
+    return np.allclose(matrix, np.round(matrix))
+
+
+class TransformStack:
+    def __init__(self):
+        self.entries = []
+
+    def push(self, transform, **transform_args):
+        self.entries.append((transform, transform_args))
+
+    def pop(self):
+        return self.entries.pop()
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self):
+        return tuple((transform.__name__, tuple(sorted(args.items()))) for transform, args in self.entries)
+
+    def matrix(self, shape):
+        composed = np.eye(3)
+        for transform, args in self.entries:
+            if is_geometric(transform):
+                composed = MATRICES[transform](shape, **args) @ composed
+        return composed
+
+    def warp(self, image, border_value=0):
+        matrix = self.matrix(image.shape)
+        if np.allclose(matrix, np.eye(3)):
+            return image
+        if image.dtype.type not in WARPABLE_TYPES:
+            image = image.astype(np.float32)
+        # flips and right-angle rotations only move whole pixels, so they are resampled exactly
+        interpolation = cv2.INTER_NEAREST if _is_axis_aligned(matrix) else cv2.INTER_LINEAR
+        return cv2.warpAffine(image, matrix[:2], (image.shape[1], image.shape[0]), flags=interpolation,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=float(border_value))
+
+    def filters(self):
+        return [(transform, args) for transform, args in self.entries if not is_geometric(transform)]
+
+    def filter(self, image):
+        return apply_filters(image, self.filters())
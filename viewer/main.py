@@ -1,17 +1,32 @@
 import tkinter as tk
-from tkinter import messagebox, ttk, scrolledtext
+from tkinter import messagebox, ttk
 from tkinter.colorchooser import askcolor
 from tkinter.simpledialog import askinteger
 
+import numpy as np
+
+from viewer.command.annotations import AnnotationStore, RestoredAnnotationsCommand, collect, record
+from viewer.command.command import TransformCommand
 from viewer.command.command_executor import CommandExecutor
-from viewer.dicom_utils.io import read_dicom, list_dicoms_from_dir
+from viewer.dicom_utils.directory_index import directory_index
+from viewer.dicom_utils.frames import FrameSource, CinePlayer, frame_count, frame_rate
+from viewer.dicom_utils.io import read_dicom, list_dicoms_from_dir, window_params, pixel_data, rescale_params
+from viewer.dicom_utils.prefetch import SlicePrefetcher
+from viewer.dicom_utils.tag_browser import TagBrowser
+from viewer.dicom_utils.volume import load_volume, AXIAL, CORONAL, SAGITTAL
 from viewer.dicom_utils.window import DicomImageDisplay
 from viewer.images.drawer import Drawer
 from viewer.images.edits.blur import mean, gaussian
 from viewer.images.edits.edge import canny, sobel, laplacian
 from viewer.images.edits.rotation import rotate, flip
+from viewer.images.projection import SlabProjector, MIP, MINIP, AVERAGE
+from viewer.images.thumbnail_store import ThumbnailStore
+from viewer.images.thumbnails import ThumbnailRing
+from viewer.utils.memory import PRIORITY_PREVIEW
 from viewer.utils.program_data import PROGRAM_NAME, AUTHORS, VERSION, REPO_LINK
 
+DEFAULT_SLAB_THICKNESS = 10
+
 
 class MainWindow:
 
@@ -26,6 +41,45 @@ class MainWindow:
         self._setup_menubar()
         self._setup_menu()
         self.dcm = None
+        self.prefetcher = SlicePrefetcher()
+        self.frames = None
+        self.frame_index = 0
+        self.cine = None
+        self.volume = None
+        self.plane = AXIAL
+        self.slice_index = 0
+        self.slab_mode = None
+        self.slab_thickness = DEFAULT_SLAB_THICKNESS
+        self.projector = None
+        self.annotation_store = AnnotationStore()
+        self.annotation_uid = None
+        self.main.protocol("WM_DELETE_WINDOW", self._close)
+
+    def _close(self):
+        self._save_annotations()
+        self.annotation_store.close()
+        self.thumbnail_store.close()
+        self.main.destroy()
+
+    def _save_annotations(self):
+        if self.annotation_uid is None:
+            return
+        uid, self.annotation_uid = self.annotation_uid, None
+        self.annotation_store.put(uid, collect(self.executor.done))
+
+    def _record_annotation(self, command):
+        if self.volume is None:
+            record(command, self.display.canvas_to_image_matrix())
+
+    def _restore_annotations(self):
+        uid = self.dcm.get('SOPInstanceUID')
+        if uid is None:
+            return
+        self.annotation_uid = str(uid)
+        annotations = self.annotation_store.get(self.annotation_uid)
+        if annotations:
+            to_canvas = np.linalg.inv(self.display.canvas_to_image_matrix())
+            self.executor.execute(RestoredAnnotationsCommand(self.canvas, annotations, to_canvas))
 
     def _setup_default_bindings(self):
         self.canvas.unbind("<Motion>")
@@ -39,14 +93,7 @@ class MainWindow:
     def _setup_tag_list(self):
         self.tag_frame = tk.Frame(master=self.main, height=512)
         self.tag_frame.grid(row=2, column=0, sticky='nsew')
-        self.tag_list_scrollbar = tk.Scrollbar(master=self.tag_frame, orient=tk.HORIZONTAL)
-        self.tag_list_scrollbar.config()
-        self.tag_list = tk.scrolledtext.ScrolledText(master=self.tag_frame, wrap='none',
-                                                     xscrollcommand=self.tag_list_scrollbar.set, height=31)
-        self.tag_list.pack(fill=tk.BOTH)
-        self.tag_list_scrollbar.pack(fill=tk.X)
-        self.tag_list.config(state=tk.DISABLED)
-        self.tag_list_scrollbar.config(command=self.tag_list.xview)
+        self.tag_list = TagBrowser(self.tag_frame)
 
     def _setup_initial_image(self):
         self.dir_path = ''
@@ -55,6 +102,8 @@ class MainWindow:
     def _setup_preview(self):
         self.preview_count = 15
         self.offset = 0
+        self.thumbnail_store = ThumbnailStore()
+        self.thumbnails = ThumbnailRing(self.preview_count, loader=self.thumbnail_store.load)
         self.preview_frame = tk.Frame(master=self.main, height=64, width=512)
         self.preview_frame.grid(row=1, column=0, columnspan=2)
         self.previous_preview_button = tk.Button(master=self.preview_frame, text="<", command=self.previous_preview,
@@ -71,8 +120,9 @@ class MainWindow:
             self.preview_frames[i].grid(row=0, column=i + 1)
         self.preview_canvases = [tk.Canvas(self.preview_frames[i], width=64, height=64) for i in
                                  range(self.preview_count)]
-        self.previews = [DicomImageDisplay(self.preview_canvases[i], with_window=False, print_window=False) for i in
-                         range(self.preview_count)]
+        # thumbnails arrive rendered, so the previews keep no render cache of their own
+        self.previews = [DicomImageDisplay(self.preview_canvases[i], with_window=False, print_window=False,
+                                           cache_bytes=0, priority=PRIORITY_PREVIEW) for i in range(self.preview_count)]
         self.preview_labels = [tk.Label(self.preview_frames[i], text='', height=1, width=6) for i in
                                range(self.preview_count)]
         for i in range(self.preview_count):
@@ -125,35 +175,56 @@ class MainWindow:
 
         transformmenu = tk.Menu(menubar, tearoff=False)
         editmenu_edge = tk.Menu(transformmenu, tearoff=False)
-        editmenu_edge.add_command(label='Canny', command=self.display.get_apply_transform(canny))
-        editmenu_edge.add_command(label='Sobel', command=self.display.get_apply_transform(sobel))
-        editmenu_edge.add_command(label='Laplacian', command=self.display.get_apply_transform(laplacian))
+        editmenu_edge.add_command(label='Canny', command=self.get_apply_transform(canny))
+        editmenu_edge.add_command(label='Sobel', command=self.get_apply_transform(sobel))
+        editmenu_edge.add_command(label='Laplacian', command=self.get_apply_transform(laplacian))
         transformmenu.add_cascade(label='Edge', menu=editmenu_edge)
 
         editmenu_blur = tk.Menu(transformmenu, tearoff=False)
-        editmenu_blur.add_command(label='Median', command=self.display.get_apply_transform(mean))
-        editmenu_blur.add_command(label='Gaussian', command=self.display.get_apply_transform(gaussian))
+        editmenu_blur.add_command(label='Median', command=self.get_apply_transform(mean))
+        editmenu_blur.add_command(label='Gaussian', command=self.get_apply_transform(gaussian))
         transformmenu.add_cascade(label='Blur', menu=editmenu_blur)
 
         editmenu_rotate = tk.Menu(transformmenu, tearoff=False)
         editmenu_rotate.add_command(label='Rotate 90 right',
-                                    command=self.display.get_apply_transform(rotate, angle=-90))
+                                    command=self.get_apply_transform(rotate, angle=-90))
         editmenu_rotate.add_command(label='Rotate 90 left',
-                                    command=self.display.get_apply_transform(rotate, angle=90))
+                                    command=self.get_apply_transform(rotate, angle=90))
         editmenu_rotate.add_command(label='Rotate custom angle',
-                                    command=self.get_ask_and_apply(self.display.get_apply_transform, rotate, k='angle'))
+                                    command=self.get_ask_and_apply(self.get_apply_transform, rotate, k='angle'))
         editmenu_rotate.add_command(label='Flip horizontally',
-                                    command=self.display.get_apply_transform(flip, flip_type=1))
+                                    command=self.get_apply_transform(flip, flip_type=1))
         editmenu_rotate.add_command(label='Flip vertically',
-                                    command=self.display.get_apply_transform(flip, flip_type=0))
+                                    command=self.get_apply_transform(flip, flip_type=0))
 
         transformmenu.add_cascade(label='Flip or rotate', menu=editmenu_rotate)
 
         menubar.add_cascade(label='Transform', menu=transformmenu)
+
+        seriesmenu = tk.Menu(menubar, tearoff=False)
+        seriesmenu.add_command(label='Load volume', command=self._load_volume)
+        seriesmenu.add_command(label='Axial', command=self.get_show_plane(AXIAL))
+        seriesmenu.add_command(label='Coronal', command=self.get_show_plane(CORONAL))
+        seriesmenu.add_command(label='Sagittal', command=self.get_show_plane(SAGITTAL))
+
+        seriesmenu_slab = tk.Menu(seriesmenu, tearoff=False)
+        seriesmenu_slab.add_command(label='Off', command=self.get_set_slab_mode(None))
+        seriesmenu_slab.add_command(label='MIP', command=self.get_set_slab_mode(MIP))
+        seriesmenu_slab.add_command(label='MinIP', command=self.get_set_slab_mode(MINIP))
+        seriesmenu_slab.add_command(label='Average', command=self.get_set_slab_mode(AVERAGE))
+        seriesmenu_slab.add_command(label='Thickness', command=self._ask_slab_thickness)
+        seriesmenu.add_cascade(label='Slab', menu=seriesmenu_slab)
+        menubar.add_cascade(label='Series', menu=seriesmenu)
         menubar.add_command(label='Info', command=self._show_info)
 
         self.main.config(menu=menubar)
 
+    def get_apply_transform(self, transform, **transform_args):
+        def apply():
+            if self.display.image_set:
+                self.executor.execute(TransformCommand(self.display, transform, **transform_args))
+        return apply
+
     def get_ask_and_apply(self, func, *args, **kwargs):
         def f():
             x = askinteger('Rotation angle', 'Enter rotation angle', parent=self.main)
@@ -172,6 +243,11 @@ class MainWindow:
         self.executor = CommandExecutor(self.canvas, None)
         self.drawer = Drawer(self.canvas, self.executor)
         self.display = DicomImageDisplay(self.canvas, with_window=True, print_window=True)
+        self.drawer.statistics = self._roi_statistics
+        self.drawer.confirmed = self._record_annotation
+        self.canvas.bind("<MouseWheel>", self._step_frame)
+        self.canvas.bind("<Button-4>", self._step_frame)
+        self.canvas.bind("<Button-5>", self._step_frame)
 
     def _setup_drawing_bindings(self):
         self.canvas.bind("<ButtonPress-1>", self.drawer.draw_curve)
@@ -260,6 +336,100 @@ class MainWindow:
             self._setup_window_bindings()
             self.window_button.config(relief="sunken")
 
+    def _cine_button_command(self):
+        if self.cine is not None and self.cine.playing():
+            self._stop_cine()
+        elif self.frames is not None:
+            self.cine = CinePlayer(self.canvas, self.frames.count, self._show_frame, frame_rate(self.dcm))
+            self.cine.start(self.frame_index)
+            self.cine_button.config(relief="sunken")
+
+    def _roi_statistics(self, kind, point1, point2):
+        if self.dcm is None:
+            return None
+        slope, intercept, unit = rescale_params(self.dcm)
+        stats = self.display.roi_statistics(kind, point1, point2, slope, intercept)
+        if stats is not None:
+            stats['unit'] = unit
+        return stats
+
+    def _stop_cine(self):
+        if self.cine is not None and self.cine.playing():
+            self.cine.stop()
+            self._show_description('Cine: {:.1f} fps achieved, {} frames dropped'.format(self.cine.achieved_fps(),
+                                                                                       self.cine.dropped))
+        self.cine_button.config(relief="raised")
+
+    def _step_frame(self, event):
+        step = 1 if event.num == 5 or event.delta < 0 else -1
+        if self.volume is not None:
+            self._show_slice(min(max(self.slice_index + step, 0), self.volume.count(self.plane) - 1))
+        elif self.frames is not None:
+            self._show_frame((self.frame_index + step) % self.frames.count)
+
+    def _load_volume(self):
+        if self.dcm is None or not self.dir_path:
+            return
+        self._stop_cine()
+        self._save_annotations()
+        self.volume = load_volume(directory_index(self.dir_path), self.dcm.get('SeriesInstanceUID'))
+        self.get_show_plane(self.plane)()
+
+    def get_show_plane(self, plane):
+        def show_plane():
+            if self.volume is None:
+                return
+            self.plane = plane
+            self.projector = None
+            self.slice_index = self.volume.count(plane) // 2
+            image = self.volume.slice(plane, self.slice_index)
+            series = self.dcm.get('SeriesInstanceUID')
+            self.display.set_image(image, *window_params(self.dcm), self.dcm.data_element("BitsStored").value,
+                                   key=('volume', str(series), plane) if series else None)
+            # reformats are stretched over the canvas like any image, the slice spacing keeps measurements right
+            self.drawer.pixel_spacing = self.volume.spacing(plane)
+            self.drawer.rescale_factor = (self._canvas_dimensions()[0] / image.shape[1],
+                                          self._canvas_dimensions()[1] / image.shape[0])
+            self.executor.reset()
+            self._show_slice(self.slice_index)
+
+        return show_plane
+
+    def _show_slice(self, index):
+        self.slice_index = index
+        if self.slab_mode is None:
+            image = self.volume.slice(self.plane, index)
+        else:
+            if self.projector is None:
+                self.projector = SlabProjector(self.volume.stack(self.plane), self.slab_mode, self.slab_thickness)
+            image = self.projector.project(index)
+        self.display.set_frame(image, (self.plane, index, self.slab_mode, self.slab_thickness))
+        description = '{} {}/{}'.format(self.plane.capitalize(), index + 1, self.volume.count(self.plane))
+        if self.slab_mode is not None:
+            description += ' {} {}'.format(self.slab_mode.upper(), self.projector.thickness)
+        self._show_description(description)
+
+    def get_set_slab_mode(self, mode):
+        def set_slab_mode():
+            self.slab_mode = mode
+            self.projector = None
+            if self.volume is not None:
+                self._show_slice(self.slice_index)
+        return set_slab_mode
+
+    def _ask_slab_thickness(self):
+        x = askinteger('Slab thickness', 'Enter slab thickness in slices', parent=self.main, minvalue=1)
+        if x is not None:
+            self.slab_thickness = x
+            self.get_set_slab_mode(self.slab_mode)()
+
+    def _show_frame(self, index):
+        self.frame_index = index
+        self.display.set_frame(self.frames.frame(index), index)
+        if self.cine is not None and self.cine.playing():
+            self._show_description('Frame {}/{}, {:.1f} fps'.format(index + 1, self.frames.count,
+                                                                  self.cine.achieved_fps()))
+
     def _clear_button_command(self):
         self.executor.reset()
 
@@ -305,6 +475,8 @@ class MainWindow:
                                                 description='Clears image and edit history')
         self.window_button = self._create_button(text="Window", command=self._window_button_command,
                                                  description='Edits image window width and centre')
+        self.cine_button = self._create_button(text="Cine", command=self._cine_button_command,
+                                               description='Plays multi-frame images, mouse wheel steps frames')
 
     def _insert_separator(self):
         ttk.Separator(self.button_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=20)
@@ -317,9 +489,14 @@ class MainWindow:
 
     def _open_image(self, name):
         if name != '.dcm':
-            self.dcm, _ = read_dicom(self.dir_path + name)
+            self.dcm = self.prefetcher.get(self.dir_path + name)
             self._draw_image()
             self._read_tags()
+            self._prefetch_neighbours(self.dir_path + name)
+
+    def _prefetch_neighbours(self, path):
+        index = directory_index(self.dir_path)
+        self.prefetcher.prefetch_around(index.files(), index.position(path))
 
     def _open_file(self):
         self.dcm, path = read_dicom()
@@ -327,45 +504,46 @@ class MainWindow:
             return
         self.dir_path = "/".join(path.split("/")[:-1]) + "/"
         if self.dcm is not None:
-            self.drawer.pixel_spacing = self.dcm.data_element("PixelSpacing").value
-            self.drawer.rescale_factor = (self.display.canvas_dimensions()[0] / self.dcm.pixel_array.shape[0],
-                                          self.display.canvas_dimensions()[1] / self.dcm.pixel_array.shape[1])
-            self.drawer.measure = True
-            self.display.set_image(self.dcm.pixel_array, self.dcm.data_element("WindowWidth").value,
-                                   self.dcm.data_element("WindowCenter").value,
-                                   self.dcm.data_element("BitsStored").value)
-            self.executor.undo_all()
-            self.executor.clear()
             self._draw_image()
             self._read_tags()
+            self._prefetch_neighbours(path)
 
     def _draw_image(self):
-        raw_image = self.dcm.pixel_array
+        self._stop_cine()
+        self._save_annotations()
+        self.volume = None
+        self.projector = None
+        if self.frames is not None:
+            self.frames.close()
+        self.frames = FrameSource(self.dcm) if frame_count(self.dcm) > 1 else None
+        self.frame_index = 0
+        raw_image = self.frames.frame(0) if self.frames is not None else pixel_data(self.dcm)
 
         dicom_files = list_dicoms_from_dir(self.dir_path)
         self.load_previews(dicom_files[self.offset:self.offset + self.preview_count])
         self.drawer.pixel_spacing = self.dcm.data_element("PixelSpacing").value
-        self.drawer.rescale_factor = (self._canvas_dimensions()[0] / self.dcm.pixel_array.shape[0],
-                                      self._canvas_dimensions()[1] / self.dcm.pixel_array.shape[1])
+        self.drawer.rescale_factor = (self._canvas_dimensions()[0] / raw_image.shape[0],
+                                      self._canvas_dimensions()[1] / raw_image.shape[1])
         self.drawer.measure = True
-        self.display.set_image(raw_image, self.dcm.data_element("WindowWidth").value,
-                               self.dcm.data_element("WindowCenter").value,
-                               self.dcm.data_element("BitsStored").value)
-        self.executor.undo_all()
-        self.executor.clear()
+        self.display.set_image(raw_image, *window_params(self.dcm), self.dcm.data_element("BitsStored").value,
+                               key=self._image_key())
+        self.executor.reset()
+        self._restore_annotations()
+
+    def _image_key(self):
+        uid = self.dcm.get('SOPInstanceUID')
+        return str(uid) if uid else self.dcm.filename
 
     def load_previews(self, image_paths):
+        thumbnails = self.thumbnails.update(image_paths)
         for index, path in enumerate(image_paths):
-            self.load_preview(index, path)
+            self.load_preview(index, path, thumbnails[index])
         for index in range(len(image_paths), self.preview_count):
             self.load_preview(index, '')
 
-    def load_preview(self, index, path):
+    def load_preview(self, index, path, thumbnail=None):
         if path:
-            dcm = read_dicom(path)[0]
-            self.previews[index].set_image(dcm.pixel_array, dcm.data_element("WindowWidth").value,
-                                           dcm.data_element("WindowCenter").value,
-                                           dcm.data_element("BitsStored").value)
+            self.previews[index].set_image(thumbnail, None, None, 8)
         else:
             self.previews[index].set_default_image()
         self.preview_labels[index].config(text=path.split('/')[-1].split('.')[0] if path else '')
@@ -384,12 +562,9 @@ class MainWindow:
         self.function_description.config(text='')
 
     def _read_tags(self):
-        # TODO: change below map function if change in printing tag data needed
-        self.tag_text = '\n'.join(map(lambda x: str(x), self.dcm))
-        self.tag_list.config(state=tk.NORMAL)
-        self.tag_list.delete(1.0, tk.END)
-        self.tag_list.insert(tk.END, self.tag_text)
-        self.tag_list.config(state=tk.DISABLED)
+        # the header-only parse from the directory index is enough for the tag list
+        header = directory_index(self.dir_path).header(self.dcm.filename) if self.dir_path else None
+        self.tag_list.set_dataset(header if header is not None else self.dcm)
 
 
 def main():
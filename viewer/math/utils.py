@@ -29,4 +29,32 @@ def points_to_vector(p1, p2):
 
 
 def sum_vectors(v1, v2):
-    return tuple(v1[i] + v2[i] for i in range(len(v1)))
\ No newline at end of file
+    return tuple(v1[i] + v2[i] for i in range(len(v1)))
+
+
+def simplify_polyline(points, tolerance):
+    # Ramer-Douglas-Peucker - keeps the points further than tolerance from the chord of the span they lie in
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    spans = [(0, len(points) - 1)]
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        chord = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(chord[0], chord[1])
+        if length > 0:
+            distances = np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = start + 1 + farthest
+            keep[middle] = True
+            spans.append((start, middle))
+            spans.append((middle, end))
+    return points[keep]
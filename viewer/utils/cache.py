@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+
+from viewer.utils.memory import memory, buffer_size
+
+
+def array_size(value):
+    return value.nbytes
+
+
+class ByteLRUCache:
+    def __init__(self, max_bytes, size_of=array_size, priority=None, fifo=False, arrays_of=None):
+        # fifo caches evict in insertion order, reads do not keep an entry alive - arrays_of gives the arrays an
+        # entry holds, so memory accounting can count arrays shared with other consumers once
+        self.max_bytes = max_bytes
+        self.arrays_of = arrays_of if arrays_of is not None or size_of is not array_size else (lambda value: (value,))
+        self.fifo = fifo
+        self.size_of = size_of
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.priority = priority
+        if priority is not None:
+            memory.register(self, priority)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            if not self.fifo:
+                self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.size_of(value)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.bytes += size
+            self._evict(self.max_bytes)
+        if self.priority is not None:
+            memory.rebalance()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def evict(self, max_bytes):
+        with self.lock:
+            return self._evict(max_bytes)
+
+    def _evict(self, max_bytes):
+        freed = 0
+        while self.bytes > max_bytes and self.entries:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            freed += size
+        return freed
+
+    def memory_bytes(self, seen=None):
+        if seen is None or self.arrays_of is None:
+            return self.bytes
+        with self.lock:
+            values = [value for value, _ in self.entries.values()]
+        return buffer_size(*(array for value in values for array in self.arrays_of(value)), seen=seen)
+
+    def release(self, nbytes):
+        return self.evict(max(0, self.bytes - nbytes))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self.entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,112 @@
+import os
+import threading
+import weakref
+
+import numpy as np
+
+DEFAULT_BUDGET = 1024 * 1024 * 1024
+BUDGET_ENVIRONMENT_VARIABLE = 'DICOM_VIEWER_MEMORY_MB'
+
+# lower priorities are evicted first
+PRIORITY_RENDER = 10
+PRIORITY_PREFETCH = 20
+PRIORITY_DECODE = 30
+PRIORITY_HISTORY = 35
+PRIORITY_PREVIEW = 40
+PRIORITY_DISPLAY = 50
+PRIORITY_VOLUME = 60
+
+
+def _owner(array):
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def buffer_size(*arrays, seen=None):
+    # views count as the whole buffer they keep alive, once however many consumers hold it - memory mapped
+    # arrays live in the page cache, so only arrays in process memory are counted
+    seen = set() if seen is None else seen
+    total = 0
+    for array in arrays:
+        if array is None:
+            continue
+        owner = _owner(array)
+        if isinstance(owner, np.memmap) or id(owner) in seen:
+            continue
+        seen.add(id(owner))
+        total += owner.nbytes
+    return total
+
+
+def _configured_budget():
+    megabytes = os.environ.get(BUDGET_ENVIRONMENT_VARIABLE)
+    try:
+        return int(float(megabytes) * 1024 * 1024) if megabytes else DEFAULT_BUDGET
+    except ValueError:
+        return DEFAULT_BUDGET
+
+
+class MemoryAccountant:
+    # consumers implement memory_bytes() and release(nbytes), which frees up to nbytes and returns what it freed -
+    # buffers that are on screen are only counted and release nothing. Caches filled by worker threads rebalance
+    # too, so consumers are called without holding the lock and must not touch Tk. memory_bytes(seen) skips
+    # buffers already in seen, so an array shared by several consumers is counted once, by the one that keeps
+    # it longest
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.consumers = weakref.WeakKeyDictionary()
+        self.lock = threading.RLock()
+        self.evicted = 0
+
+    def register(self, consumer, priority):
+        with self.lock:
+            self.consumers[consumer] = priority
+
+    def unregister(self, consumer):
+        with self.lock:
+            self.consumers.pop(consumer, None)
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self.rebalance()
+
+    def _snapshot(self):
+        with self.lock:
+            return list(self.consumers.items())
+
+    @staticmethod
+    def _used(consumers):
+        seen = set()
+        return sum(consumer.memory_bytes(seen) for consumer, _ in sorted(consumers, key=lambda item: -item[1]))
+
+    def used(self):
+        return self._used(self._snapshot())
+
+    def rebalance(self):
+        consumers = self._snapshot()
+        excess = self._used(consumers) - self.budget
+        if excess <= 0:
+            return 0
+        freed = 0
+        for consumer, _ in sorted(consumers, key=lambda item: item[1]):
+            freed += consumer.release(excess - freed)
+            if freed >= excess:
+                break
+        with self.lock:
+            self.evicted += freed
+        return freed
+
+    def stats(self):
+        consumers = {}
+        seen = set()
+        for consumer, priority in sorted(self._snapshot(), key=lambda item: -item[1]):
+            name = '{}/{}'.format(type(consumer).__name__, priority)
+            entry = consumers.setdefault(name, {'priority': priority, 'count': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['bytes'] += consumer.memory_bytes(seen)
+        return {'budget': self.budget, 'used': sum(entry['bytes'] for entry in consumers.values()),
+                'evicted': self.evicted, 'consumers': consumers}
+
+
+memory = MemoryAccountant(_configured_budget())
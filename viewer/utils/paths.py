@@ -0,0 +1,12 @@
+import os
+
+from viewer.utils.program_data import PROGRAM_NAME
+
+
+def user_cache_dir():
+    base = os.environ.get('LOCALAPPDATA') if os.name == 'nt' else os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, PROGRAM_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path